@@ -6,6 +6,8 @@ from bs4 import BeautifulSoup
 import requests
 import os
 import dotenv
+from authcache import TokenCache
+from metrics import instrument_session
 
 dotenv.load_dotenv()
 
@@ -18,6 +20,7 @@ SESSION = {
     'username':         os.getenv('ELCTROMOTIVE_USER'),
     'password':         os.getenv('ELCTROMOTIVE_PASSWORD'),
     'session_file':     'session_data.json', # where to write the seesion data
+    'token_file':       'auth-tokens.json',  # access/refresh tokens shared across runs
     'user_id':          None,   # will be filled after login
     'user_profile':     None,   # will be filled after fetching profile
 }
@@ -25,12 +28,16 @@ SESSION = {
 class WebsiteTester:
     """Handles authentication and testing for the website"""
     
-    def __init__(self):
+    def __init__(self, metrics=None):
+        """metrics: optional RequestMetrics every request of the tester is recorded in"""
         self.config = SESSION
+        self.metrics = metrics
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        if metrics:
+            instrument_session(self.session, metrics)
         self.authenticated = False
         self.session_data = {}
 
@@ -117,12 +124,25 @@ class WebsiteTester:
             print(f"✗ Error creating project: {e}")
             return False
 
-    def login(self, username=None, password=None):
+    def login(self, username=None, password=None, use_cache=True):
         """
         Attempt to login to the website
+        A token cached by an earlier run (refreshed if it is close to expiring)
+        is used instead of logging in again, unless use_cache is False
         """
         username = username or self.config['username']
         password = password or self.config['password']
+        self.tokens = TokenCache(self.config['supabase_url'], SUPABASE_KEY, email=username, password=password,
+                                 path=self.config['token_file'], metrics=self.metrics)
+        
+        if use_cache:
+            session = self.tokens.get(sign_in=False)
+            if session:
+                SESSION['user_id'] = session['user_id']
+                SESSION['BearerToken'] = session['access_token']
+                print(f"✓ Using cached auth token for {username}")
+                self.authenticated = True
+                return True
                
         print(f"URL: {self.config['login_url']}")        
            
@@ -156,6 +176,8 @@ class WebsiteTester:
         d =  response.json().get('user', {})
         SESSION['user_id'] = d.get('id', '')
         SESSION['BearerToken'] = response.json().get('access_token', '')
+        if response.json().get('refresh_token'):
+            self.tokens.store(response.json())
 
         # Check if login was successful
         # Common indicators: redirect, specific cookies, response content
@@ -257,6 +279,23 @@ class WebsiteTester:
             print(f"✗ POST request failed: {e}")
             return None
 
+    def load_test(self, users=10, ramp_up=0, duration=30, mix=None, think_time=0):
+        """
+        Hit the site's REST endpoints with concurrent virtual users (see loadtest.py)
+        Returns the summary: latency percentiles, error rates and throughput per endpoint
+        """
+        from loadtest import LoadTest
+        
+        if not self.authenticated:
+            self.login()
+        headers = {
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SESSION.get('BearerToken', '')}"
+        }
+        test = LoadTest(self.config['base_url'], headers, SESSION['user_id'], users=users, ramp_up=ramp_up,
+                        duration=duration, mix=mix, think_time=think_time)
+        return test.run()
+
     def show_session_info(self):
         """Display current session information"""
         print("\n" + "="*60)
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import random
+import time
+from supabase import AClientOptions, acreate_client
+from projectplan import ProjectRecords
+from authcache import TokenCache
+from metrics import RequestMetrics, describe_request
+
+
+class AsyncSupabaseClient(ProjectRecords):
+    """
+    asyncio flavour of SupabaseClient. Inside a project the components,
+    timeline entries and phases/tasks are inserted concurrently; across
+    projects a semaphore limits how many are in progress at once.
+
+    Build it with `await AsyncSupabaseClient.create(config)`, since creating
+    the client is itself a coroutine.
+    """
+
+    def __init__(self, config:dict, chunk_size:int = 500, verbose:bool = False, concurrency:int = 8,
+                 metrics:RequestMetrics = None, run_tag:str = None):
+        from dotenv import load_dotenv
+        load_dotenv()
+        self.supabase_url = os.getenv("SUPABASE_URL")
+        self.supabase_key = os.getenv("SUPABASE_KEY")
+        self.supabase = None            # set by create()
+        self._session = None            # last session taken from the token cache
+
+        self.data = json.load(open('lists.json'))
+        self.chunk_size = chunk_size    # rows per array insert
+        self.verbose = verbose          # print every generated row
+        self.concurrency = concurrency  # projects in progress at once
+        self.metrics = metrics or RequestMetrics()
+        self.run_tag = run_tag          # seed_run_id of every row written
+        self.SESSION = config
+
+    @classmethod
+    async def create(cls, config:dict, **kwargs):
+        self = cls(config, **kwargs)
+        self.tokens = TokenCache(self.supabase_url, self.supabase_key,
+                                 email=config.get('username'), password=config.get('password'),
+                                 path=config.get('token_file', 'auth-tokens.json'), metrics=self.metrics)
+        # the cache may take a file lock and sign in over HTTP, keep that off the event loop
+        session = self._session = await asyncio.to_thread(self.tokens.get)
+        self.SESSION['user_id'] = session['user_id']
+        self.SESSION['BearerToken'] = session['access_token']
+        self.supabase = await acreate_client(self.supabase_url, self.supabase_key,
+                                             AClientOptions(headers={"Authorization": f"Bearer {session['access_token']}"}))
+        return self
+
+    async def _execute(self, query):
+        """
+        Run a PostgREST query, swapping in a new access token first when the
+        cached one is about to expire, and record it in self.metrics
+        """
+        if not self.tokens.fresh(self._session):
+            session = self._session = await asyncio.to_thread(self.tokens.get)
+            if session['access_token'] != self.SESSION.get('BearerToken'):
+                self.SESSION['BearerToken'] = session['access_token']
+                self.supabase.postgrest.auth(session['access_token'])
+
+        table, operation, rows, payload_bytes = describe_request(query)
+        started = time.perf_counter()
+        try:
+            response = await query.execute()
+        except Exception:
+            self.metrics.record(table, operation, time.perf_counter() - started, 0, payload_bytes, error=True)
+            raise
+        if operation == "select":
+            rows = len(response.data)
+        self.metrics.record(table, operation, time.perf_counter() - started, rows, payload_bytes)
+        return response
+
+    async def insert_rows(self, table, rows, chunk_size = None) -> list:
+        """
+        Insert rows into a table as chunked array inserts.
+        Returns the inserted rows as reported by PostgREST.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        inserted = []
+        self.tag(rows)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            response = await self._execute(self.supabase.table(table).insert(chunk))
+            inserted.extend(response.data)
+            print(f"  ~ Inserted {len(chunk)} rows into {table} ({start + len(chunk)}/{len(rows)})")
+        return inserted
+
+    async def create_conversion_phases(self, project_id):
+        phase_records = self.build_phase_records(project_id)
+        inserted = await self.insert_rows("project_phases", phase_records, chunk_size=len(phase_records))
+        phase_ids = {row['phase_order']: row['id'] for row in inserted}
+
+        task_records = self.build_task_records(phase_ids)
+        await self.insert_rows("project_tasks", task_records, chunk_size=len(task_records))
+        return phase_ids
+
+    async def create_project(self, count = 10) -> str:
+        """
+        Create count projects, at most self.concurrency at a time. A project
+        that fails is reported and skipped without stopping the others.
+        """
+        vehicles = self.open_catalog().hosted
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded():
+            async with semaphore:
+                return await self._create_one_project(vehicles)
+
+        results = await asyncio.gather(*(bounded() for _ in range(count)), return_exceptions=True)
+
+        project_id = None
+        failed = 0
+        for result in results:
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"✗ Project failed: {result}")
+            else:
+                project_id = result
+
+        print(f"Created {count - failed} of {count} projects ({failed} failed)")
+        return project_id
+
+    async def _create_one_project(self, vehicles) -> str:
+        vehicle = random.choice(vehicles)
+        print(f"Creating project for vehicle: {vehicle['year']} {vehicle['make']} {vehicle['model']}")
+        record = self.tag([self.build_project_record(vehicle)])[0]
+        response = await self._execute(self.supabase.table("projects").insert(record))
+        project_id = response.data[0]['id']
+        print(f"Created new project: {record['project_title']} (ID: {project_id})")
+
+        # every child table only depends on the project id, so send them together
+        await asyncio.gather(
+            self.insert_rows("project_components", self.build_component_records(project_id)),
+            self.insert_rows("project_timeline_entries", self.build_timeline_records(project_id, vehicle=vehicle)),
+            self.create_conversion_phases(project_id),
+        )
+        return project_id
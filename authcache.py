@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+import requests
+from processlock import file_lock
+
+"""
+Supabase auth tokens shared across runs and processes.
+
+Signing in costs a round trip on every start, twice (WebsiteTester.login() and
+the Supabase client each signed in). TokenCache keeps the access token, refresh
+token and expiry of every account in one JSON file, guarded by a lock file so
+parallel worker processes take turns. A token is refreshed `refresh_margin`
+seconds before it expires, so a long run never sends an expired one, and a
+full password sign-in only happens when there is nothing usable to refresh.
+"""
+
+
+class TokenCache:
+
+    def __init__(self, supabase_url = None, supabase_key = None, email = None, password = None,
+                 path = 'auth-tokens.json', refresh_margin = 300, metrics = None):
+        """
+        Args:
+            supabase_url, supabase_key: project to authenticate against (default from .env)
+            email, password: account to sign in as (default from .env)
+            path: JSON file shared by every run and process
+            refresh_margin: refresh tokens this many seconds before they expire
+            metrics: optional RequestMetrics the token requests are recorded in
+        """
+        self.supabase_url = (supabase_url or os.getenv("SUPABASE_URL") or '').rstrip('/')
+        self.supabase_key = supabase_key or os.getenv("SUPABASE_KEY")
+        self.email = email or os.getenv("ELCTROMOTIVE_USER")
+        self.password = password or os.getenv("ELCTROMOTIVE_PASSWORD")
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.metrics = metrics
+        self.key = f"{self.supabase_url}|{self.email}"
+        self._session = None
+        self._lock = threading.Lock()
+
+    def fresh(self, session) -> bool:
+        return bool(session) and session['expires_at'] - self.refresh_margin > time.time()
+
+    def get(self, sign_in = True) -> dict:
+        """
+        A usable session: dict with access_token, refresh_token, expires_at
+        (epoch seconds) and user_id. Only touches the file or the network when
+        the token held in memory is about to expire. With sign_in=False returns
+        None rather than signing in with the password.
+        """
+        session = self._session
+        if self.fresh(session):
+            return session
+        with self._lock:
+            if self.fresh(self._session):
+                return self._session
+            with self._file_lock():
+                # another process may have refreshed it already
+                session = self._read().get(self.key)
+                if not self.fresh(session):
+                    session = self._renew(session, sign_in)
+                    if session is None:
+                        return None
+                    self._write(session)
+            self._session = session
+            return session
+
+    def store(self, data) -> dict:
+        """Keep the tokens of a sign-in done elsewhere (a GoTrue token response)"""
+        session = self._parse(data)
+        with self._lock, self._file_lock():
+            self._write(session)
+            self._session = session
+        return session
+
+    def _renew(self, stored, sign_in = True) -> dict:
+        if stored and stored.get('refresh_token'):
+            try:
+                session = self._grant('refresh_token', {"refresh_token": stored['refresh_token']})
+                session['user_id'] = session['user_id'] or stored.get('user_id')
+                print(f"✓ Refreshed auth token for {self.email}")
+                return session
+            except requests.RequestException as e:
+                print(f"⚠ Could not refresh auth token ({e})")
+        if not sign_in:
+            return None
+        session = self._grant('password', {"email": self.email, "password": self.password})
+        print(f"✓ Signed in as {self.email}")
+        return session
+
+    def _grant(self, grant_type, body) -> dict:
+        started = time.perf_counter()
+        try:
+            response = requests.post(
+                f"{self.supabase_url}/auth/v1/token",
+                params={"grant_type": grant_type},
+                json=body,
+                headers={"apikey": self.supabase_key, "Content-Type": "application/json"},
+                timeout=30)
+            response.raise_for_status()
+        except requests.RequestException:
+            if self.metrics:
+                self.metrics.record("auth", grant_type, time.perf_counter() - started, error=True)
+            raise
+        if self.metrics:
+            self.metrics.record("auth", grant_type, time.perf_counter() - started, rows=1)
+        return self._parse(response.json())
+
+    @staticmethod
+    def _parse(data) -> dict:
+        return {
+            "access_token":  data['access_token'],
+            "refresh_token": data.get('refresh_token'),
+            "expires_at":    data.get('expires_at') or time.time() + data.get('expires_in', 3600),
+            "user_id":       (data.get('user') or {}).get('id'),
+        }
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, session):
+        sessions = self._read()
+        sessions[self.key] = session
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        # the file holds live credentials, keep it private to the user
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+            json.dump(sessions, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def _file_lock(self):
+        return file_lock(self.path + '.lock')
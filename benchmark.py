@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from metrics import RequestMetrics, histogram_quantile, BUCKETS
+from supabasestub import start_stub
+
+"""
+End-to-end seeding benchmarks against the local Supabase stand-in.
+
+Runs SupabaseClient.create_project (or seed_projects with --mode seed) for
+every combination of project count, worker count and chunk size, each time
+against an empty in-memory stub with the given latency, and reports projects/s,
+rows/s, requests per project and request latency. Every result is appended to
+a JSONL history with the commit it ran on, and compared with the last result
+of the same configuration, so throughput can be tracked over time.
+
+    python benchmark.py --counts 50,200 --workers 1,4,8 --chunk-sizes 100,500 --latency-ms 20
+    python benchmark.py --mode seed --counts 1000 --workers 1,4 --batch-projects 50,200
+"""
+
+MAKES = {
+    "Ford":      ["Mustang", "F-100", "Bronco"],
+    "Chevrolet": ["Camaro", "C10", "Corvette"],
+    "Volkswagen": ["Beetle", "Bus", "Golf"],
+    "Porsche":   ["911", "914"],
+    "Datsun":    ["240Z", "510"],
+}
+
+
+def benchmark_dataset(path, base_url, images_per_vehicle = 4) -> str:
+    """Write a small dataset of hosted vehicles, for when no car_dataset.json is around"""
+    dataset = []
+    for make, models in MAKES.items():
+        for model in models:
+            for year in range(1965, 1975, 3):
+                for n in range(images_per_vehicle):
+                    file_path = f"{make} {model} {year}/{n:03d}.jpg"
+                    dataset.append({"make": make, "model": model, "year": str(year), "file_path": file_path,
+                                    "hosted_url": f"{base_url}/images/{file_path.replace(' ', '_')}"})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dataset, f)
+    return path
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(stub, config, mode, count, workers, chunk_size, batch_projects, max_in_flight, verbose = False,
+             use_rpc = False) -> dict:
+    """One benchmark run against an emptied stub"""
+    from supabaseclient import SupabaseClient
+
+    stub.reset()
+    metrics = RequestMetrics()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        S = SupabaseClient(dict(config), chunk_size=chunk_size, max_in_flight=max_in_flight, metrics=metrics,
+                           use_rpc=use_rpc)
+        started = time.perf_counter()
+        if mode == 'seed':
+            S.seed_projects(count, seed=1, batch_projects=batch_projects, workers=workers)
+        else:
+            S.create_project(count=count, workers=workers, batch_projects=batch_projects or 1)
+        elapsed = time.perf_counter() - started
+
+    summary = metrics.summary()
+    rest = [row for row in summary['tables'] if row['table'] != 'auth']
+    requests = sum(row['requests'] for row in rest)
+    buckets = [0] * (len(BUCKETS) + 1)
+    for (table, operation), series in metrics.snapshot_items():
+        if table != 'auth':
+            buckets = [a + b for a, b in zip(buckets, series['buckets'])]
+    stored = stub.counts()
+    written = sum(stored.values())
+    return {
+        "mode":             mode + ("+rpc" if use_rpc else ""),
+        "count":            count,
+        "workers":          workers,
+        "chunk_size":       chunk_size,
+        "batch_projects":   batch_projects,
+        "max_in_flight":    max_in_flight,
+        "seconds":          elapsed,
+        "projects":         stored.get('projects', 0),
+        "projects_per_s":   stored.get('projects', 0) / elapsed,
+        "rows":             written,
+        "rows_per_s":       written / elapsed,
+        "requests":         requests,
+        "requests_per_project": requests / count,
+        "errors":           sum(row['errors'] for row in rest),
+        "p50_ms":           1000 * (histogram_quantile(buckets, 0.50) or 0),
+        "p95_ms":           1000 * (histogram_quantile(buckets, 0.95) or 0),
+        "rows_stored":      stored,
+    }
+
+
+def case_key(result, stub_options) -> tuple:
+    return (result['mode'], result['count'], result['workers'], result['chunk_size'], result['batch_projects'],
+            result['max_in_flight'], *sorted(stub_options.items()))
+
+
+def read_history(path) -> dict:
+    """Latest result of every configuration in the history file"""
+    latest = {}
+    if not os.path.exists(path):
+        return latest
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                latest[case_key(record, record['stub'])] = record
+    return latest
+
+
+def print_results(results, previous, stub_options):
+    print("\n" + "="*108)
+    print(f"SEEDING BENCHMARK (stub {stub_options['latency_ms']}±{stub_options['jitter_ms']} ms "
+          f"+ {stub_options['row_latency_ms']} ms/row)")
+    print("="*108)
+    print(f"{'mode':<11}{'count':>6}{'workers':>8}{'chunk':>6}{'batch':>6}{'seconds':>9}{'proj/s':>9}{'rows/s':>10}"
+          f"{'req/proj':>9}{'p50 ms':>8}{'p95 ms':>8}{'errors':>7}{'vs last':>10}")
+    for result in results:
+        last = previous.get(case_key(result, stub_options))
+        trend = f"{100 * (result['projects_per_s'] / last['projects_per_s'] - 1):+8.1f}%" \
+            if last and last['projects_per_s'] else "         -"
+        print(f"{result['mode']:<11}{result['count']:>6}{result['workers']:>8}{result['chunk_size']:>6}"
+              f"{result['batch_projects'] or '-':>6}{result['seconds']:>9.2f}{result['projects_per_s']:>9.1f}"
+              f"{result['rows_per_s']:>10.0f}{result['requests_per_project']:>9.2f}{result['p50_ms']:>8.1f}"
+              f"{result['p95_ms']:>8.1f}{result['errors']:>7}{trend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark project seeding against a local Supabase stand-in")
+    parser.add_argument('--mode', choices=['create', 'seed'], default='create',
+                        help="create_project (per-project round trips) or seed_projects (batched plan graphs)")
+    parser.add_argument('--counts', default='50', help="comma-separated project counts")
+    parser.add_argument('--workers', default='1,4', help="comma-separated worker counts")
+    parser.add_argument('--chunk-sizes', default='500', help="comma-separated rows per array insert")
+    parser.add_argument('--batch-projects', default='100', help="comma-separated project graphs per batch (seed mode, or per call with --rpc)")
+    parser.add_argument('--rpc', action='store_true', help="create graphs with the create_project_graphs function")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="concurrent requests across all workers")
+    parser.add_argument('--repeat', type=int, default=1, help="runs of every configuration")
+    parser.add_argument('--latency-ms', type=float, default=10, help="stub latency of every request")
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--row-latency-ms', type=float, default=0.02, help="stub latency per row written")
+    parser.add_argument('--dataset', default='car_dataset.json', help="vehicles to sample (a small synthetic set if missing)")
+    parser.add_argument('--history', default='benchmark-history.jsonl', help="results are appended here")
+    parser.add_argument('--verbose', action='store_true', help="show the seeder's own output")
+    args = parser.parse_args()
+
+    def numbers(text):
+        return [int(value) for value in text.split(',')]
+
+    stub_options = {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "row_latency_ms": args.row_latency_ms}
+    stub, server, url = start_stub(**stub_options)
+    workdir = tempfile.mkdtemp(prefix='seed-bench-')
+    # the client reads these through load_dotenv, which leaves variables already set alone
+    os.environ['SUPABASE_URL'], os.environ['SUPABASE_KEY'] = url, 'stub-key'
+
+    from projectplan import ProjectPlanner, ProjectRecords, hosted_vehicles
+    dataset = args.dataset
+    if not os.path.exists(dataset) or not len(hosted_vehicles(dataset)):
+        dataset = benchmark_dataset(os.path.join(workdir, 'car_dataset.json'), url)
+    ProjectRecords.dataset_json = ProjectPlanner.dataset_json = dataset
+
+    config = {'username': 'bench@example.com', 'password': 'bench', 'cluster_id': None,
+              'token_file': os.path.join(workdir, 'auth-tokens.json')}
+    batches = numbers(args.batch_projects) if args.mode == 'seed' or args.rpc else [None]
+    cases = list(itertools.product(numbers(args.counts), numbers(args.workers), numbers(args.chunk_sizes), batches))
+    print(f"Benchmarking {len(cases)} configurations x {args.repeat} against {url}...")
+
+    # fill the sentence pool and compile the vehicle catalog outside the timed runs
+    print("Warming up...")
+    run_case(stub, config, args.mode, 2, 1, 500, 2, args.max_in_flight, args.verbose, args.rpc)
+
+    previous = read_history(args.history)
+    commit, started_at = git_commit(), datetime.now().isoformat()
+    results = []
+    try:
+        for count, workers, chunk_size, batch_projects in cases:
+            for _ in range(args.repeat):
+                result = run_case(stub, config, args.mode, count, workers, chunk_size, batch_projects,
+                                  args.max_in_flight, args.verbose, args.rpc)
+                print(f"  {result['mode']} count={count} workers={workers} chunk={chunk_size}"
+                      f"{f' batch={batch_projects}' if batch_projects else ''}: "
+                      f"{result['projects_per_s']:.1f} projects/s")
+                results.append(result)
+                with open(args.history, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({**result, "commit": commit, "started_at": started_at,
+                                        "stub": stub_options}) + "\n")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print_results(results, previous, stub_options)
+    print(f"Results appended to {args.history}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlparse
+import requests
+
+"""
+Load testing for the site's REST endpoints.
+
+N virtual users, each on its own requests.Session, start spread over a ramp-up
+period and then loop over a weighted mix of the requests WebsiteTester makes
+(projects, profile, ...) until the duration is up. Latency percentiles, error
+rates and throughput are reported per endpoint.
+
+    python loadtest.py run --users 50 --ramp-up 10 --duration 60 --mix projects=6,profile=1,timeline=3
+    python loadtest.py stub --port 8900 --latency-ms 20      # local target to test against
+    python loadtest.py run --target http://127.0.0.1:8900 --users 20 --duration 10
+"""
+
+# name -> (path, query); {user_id} is filled in per request
+ENDPOINTS = {
+    'projects':  ('rest/v1/projects',                 {'user_id': 'eq.{user_id}', 'select': '*'}),
+    'profile':   ('rest/v1/profiles',                 {'id': 'eq.{user_id}', 'select': '*'}),
+    'phases':    ('rest/v1/project_phases',           {'select': '*', 'limit': '50'}),
+    'tasks':     ('rest/v1/project_tasks',            {'select': '*', 'limit': '50'}),
+    'timeline':  ('rest/v1/project_timeline_entries', {'select': '*', 'order': 'created_at.desc', 'limit': '15'}),
+}
+DEFAULT_MIX = {'projects': 6, 'profile': 1, 'phases': 2, 'timeline': 3}
+
+
+def parse_mix(text) -> dict:
+    """'projects=6,profile=1' -> {'projects': 6, 'profile': 1}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint '{name}', expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class VirtualUser(threading.Thread):
+    """One simulated visitor: its own session, looping over the request mix"""
+
+    def __init__(self, test, number, start_at):
+        super().__init__(name=f"vu-{number}", daemon=True)
+        self.test = test
+        self.start_at = start_at
+        self.rng = random.Random(number)
+        self.session = requests.Session()
+        self.session.headers.update(test.headers)
+        # per-user results, merged once at the end so the users never contend on a lock
+        self.latencies = {name: [] for name in test.mix}
+        self.errors = {name: 0 for name in test.mix}
+
+    def run(self):
+        time.sleep(max(0, self.start_at - time.monotonic()))
+        names, weights = list(self.test.mix), list(self.test.mix.values())
+        while time.monotonic() < self.test.stop_at:
+            name = self.rng.choices(names, weights)[0]
+            path, query = ENDPOINTS[name]
+            params = {key: value.format(user_id=self.test.user_id) for key, value in query.items()}
+            started = time.perf_counter()
+            try:
+                response = self.session.get(urljoin(self.test.base_url, path), params=params, timeout=self.test.timeout)
+                response.content    # include the body transfer in the latency
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            self.latencies[name].append((time.perf_counter() - started) * 1000)
+            if not ok:
+                self.errors[name] += 1
+            if self.test.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.test.think_time))
+        self.session.close()
+
+
+class LoadTest:
+
+    def __init__(self, base_url, headers, user_id, users = 10, ramp_up = 0, duration = 30,
+                 mix = None, think_time = 0, timeout = 30):
+        """
+        Args:
+            base_url: site (or stub) the endpoint paths are relative to
+            headers: sent with every request (apikey, Authorization)
+            user_id: account whose rows the user-scoped endpoints ask for
+            users: concurrent virtual users
+            ramp_up: seconds over which the users start, evenly spaced
+            duration: seconds of load after the last user started
+            mix: endpoint name -> relative weight
+            think_time: mean pause in seconds between a user's requests
+        """
+        self.base_url = base_url.rstrip('/') + '/'
+        self.headers = headers
+        self.user_id = user_id
+        self.users = users
+        self.ramp_up = ramp_up
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.think_time = think_time
+        self.timeout = timeout
+        self.stop_at = None
+        self.started_at = None
+
+    def run(self) -> dict:
+        print(f"Load testing {self.base_url} with {self.users} users "
+              f"(ramp-up {self.ramp_up}s, duration {self.duration}s, mix {self.mix})...")
+        self.started_at = datetime.now()
+        now = time.monotonic()
+        self.stop_at = now + self.ramp_up + self.duration
+        started = time.perf_counter()
+        vus = [VirtualUser(self, n, now + self.ramp_up * n / self.users) for n in range(self.users)]
+        for vu in vus:
+            vu.start()
+        for vu in vus:
+            vu.join()
+        return self.summarize(vus, time.perf_counter() - started)
+
+    def summarize(self, vus, elapsed) -> dict:
+        endpoints = {}
+        for name in self.mix:
+            latencies = sorted(latency for vu in vus for latency in vu.latencies[name])
+            errors = sum(vu.errors[name] for vu in vus)
+            endpoints[name] = {
+                "requests":   len(latencies),
+                "errors":     errors,
+                "error_rate": errors / len(latencies) if latencies else 0,
+                "rps":        len(latencies) / elapsed,
+                "p50_ms":     percentile(latencies, 0.50),
+                "p95_ms":     percentile(latencies, 0.95),
+                "p99_ms":     percentile(latencies, 0.99),
+                "max_ms":     latencies[-1] if latencies else None,
+            }
+        total = sum(stats['requests'] for stats in endpoints.values())
+        errors = sum(stats['errors'] for stats in endpoints.values())
+        return {
+            "target":     self.base_url,
+            "started_at": self.started_at.isoformat(),
+            "users":      self.users,
+            "ramp_up":    self.ramp_up,
+            "duration":   self.duration,
+            "elapsed":    elapsed,
+            "requests":   total,
+            "errors":     errors,
+            "error_rate": errors / total if total else 0,
+            "rps":        total / elapsed,
+            "endpoints":  endpoints,
+        }
+
+
+def print_summary(summary):
+    def ms(value):
+        return f"{value:8.1f}" if value is not None else "       -"
+
+    print("\n" + "="*78)
+    print(f"LOAD TEST: {summary['users']} users, {summary['requests']} requests in {summary['elapsed']:.1f}s "
+          f"({summary['rps']:.1f} req/s, {100 * summary['error_rate']:.2f}% errors)")
+    print("="*78)
+    print(f"{'endpoint':<12}{'requests':>9}{'errors':>8}{'err %':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, stats in summary['endpoints'].items():
+        print(f"{name:<12}{stats['requests']:>9}{stats['errors']:>8}{100 * stats['error_rate']:>7.2f}{stats['rps']:>8.1f}"
+              f"{ms(stats['p50_ms'])} {ms(stats['p95_ms'])} {ms(stats['p99_ms'])} {ms(stats['max_ms'])}")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every GET with a small JSON array after the configured latency"""
+
+    protocol_version = 'HTTP/1.1'     # keep-alive, like the real site
+    disable_nagle_algorithm = True    # headers and body go out in separate writes
+
+    def __init__(self, *args, latency_ms = 0, jitter_ms = 0, error_rate = 0, rows = 15, **kwargs):
+        self.latency_ms, self.jitter_ms, self.error_rate, self.rows = latency_ms, jitter_ms, error_rate, rows
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        time.sleep(max(0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        if random.random() < self.error_rate:
+            body, status = b'{"message":"stub error"}', 503
+        else:
+            table = urlparse(self.path).path.rstrip('/').rsplit('/', 1)[-1]
+            body, status = json.dumps([{"id": i, "table": table} for i in range(self.rows)]).encode(), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stub(port = 8900, latency_ms = 0, jitter_ms = 0, error_rate = 0, bind = '127.0.0.1'):
+    handler = partial(StubHandler, latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate)
+    server = ThreadingHTTPServer((bind, port), handler)
+    server.daemon_threads = True
+    print(f"Stub target on http://{bind}:{port}/ ({latency_ms}±{jitter_ms} ms, {100 * error_rate:.1f}% errors)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the site's REST endpoints")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="generate load")
+    run.add_argument('--target', default=None, help="base url to load (default ELECTROMOTIVE_URL, logged in via WebsiteTester)")
+    run.add_argument('--users', type=int, default=10, help="concurrent virtual users")
+    run.add_argument('--ramp-up', type=float, default=0, help="seconds over which the users start")
+    run.add_argument('--duration', type=float, default=30, help="seconds of full load")
+    run.add_argument('--mix', default=None, help=f"endpoint weights, e.g. projects=6,profile=1 (endpoints: {', '.join(ENDPOINTS)})")
+    run.add_argument('--think-time', type=float, default=0, help="mean seconds between a user's requests")
+    run.add_argument('--output', default=None, help="also write the summary as JSON here")
+
+    stub = sub.add_parser('stub', help="serve a local stub target")
+    stub.add_argument('--port', type=int, default=8900)
+    stub.add_argument('--latency-ms', type=float, default=0)
+    stub.add_argument('--jitter-ms', type=float, default=0)
+    stub.add_argument('--error-rate', type=float, default=0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    if args.command == 'stub':
+        serve_stub(args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+        return
+
+    mix = parse_mix(args.mix) if args.mix else None
+    if args.target:
+        summary = LoadTest(args.target, {}, 'stub-user', users=args.users, ramp_up=args.ramp_up,
+                           duration=args.duration, mix=mix, think_time=args.think_time).run()
+    else:
+        from WebsiteTester import WebsiteTester
+        summary = WebsiteTester().load_test(users=args.users, ramp_up=args.ramp_up, duration=args.duration,
+                                            mix=mix, think_time=args.think_time)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
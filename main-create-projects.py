@@ -1,6 +1,15 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
 from WebsiteTester import WebsiteTester, SUPABASE_KEY, SESSION
 from supabaseclient import SupabaseClient
+from asyncsupabaseclient import AsyncSupabaseClient
+from projectplan import rs, write_plan
+from runmanifest import RunManifest, new_run_id
+from shardedseed import load_accounts, seed_sharded
+from metrics import RequestMetrics
+from copyloader import CopyLoader
+from teardown import teardown_run, teardown_run_direct
 
 """
 Website Testing Script - Username/Password Authentication
@@ -9,11 +18,132 @@ For testing: https://electr0alpha.netlify.app/conversionnet/login
 
 def main():
     """Main interactive testing interface"""
-    tester = WebsiteTester()
+    parser = argparse.ArgumentParser(description="Generate test EV conversion projects")
+    parser.add_argument('command', nargs='?', default='create', choices=['create', 'generate', 'load', 'teardown'],
+                        help="create projects directly, generate a plan file offline, load a plan file, "
+                             "or delete the rows of a run (--run-id)")
+    parser.add_argument('--plan', default='project-plan.jsonl', help="plan file written by generate and read by load")
+    parser.add_argument('--seed', type=int, default=None, help="seed for generate; the same seed gives the same plan")
+    parser.add_argument('--batch-projects', type=int, default=100, help="project graphs loaded per batch")
+    parser.add_argument('--run-id', default=None, help="checkpoint the run under this id; rerun with the same id to resume ('new' picks one)")
+    parser.add_argument('--manifest', default='seed-manifest.sqlite', help="SQLite file holding run checkpoints")
+    parser.add_argument('--count', type=int, default=10, help="number of projects to create")
+    parser.add_argument('--workers', type=int, default=1, help="projects built in parallel")
+    parser.add_argument('--chunk-size', type=int, default=500, help="rows per array insert")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="concurrent requests across all workers")
+    parser.add_argument('--verbose', action='store_true', help="print every generated row")
+    parser.add_argument('--use-async', action='store_true', help="create projects with the asyncio client; --workers is the number of projects in progress (not for load, --run-id, --rpc, --copy or --accounts)")
+    parser.add_argument('--accounts', default=None, help="JSON list of test accounts; create projects for all of them in parallel processes")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes for --accounts (default: one per account)")
+    parser.add_argument('--cluster-ids', default=None, help="comma-separated cluster ids handed to accounts that have none")
+    parser.add_argument('--sentence-pool', default='sentence-pool.json', help="file caching the generated sentences")
+    parser.add_argument('--sentence-pool-size', type=int, default=2000, help="sentences of each kind kept in the pool")
+    parser.add_argument('--refresh-sentences', action='store_true', help="regenerate the sentence pool before starting")
+    parser.add_argument('--rpc', action='store_true', help="create whole project graphs server-side with the create_project_graphs function")
+    parser.add_argument('--copy', action='store_true', help="stream the projects in with COPY over a direct Postgres connection (needs psycopg)")
+    parser.add_argument('--database-url', default=None, help="Postgres connection string for --copy (default DATABASE_URL)")
+    parser.add_argument('--tag-run', action='store_true', help="stamp rows with seed_run_id (the --run-id, or a new id) so teardown can remove them; needs sql/seed-run-tags.sql")
+    parser.add_argument('--delete-batch', type=int, default=250, help="teardown: ids per DELETE request")
+    parser.add_argument('--direct', action='store_true', help="teardown: delete over a direct Postgres connection (needs psycopg)")
+    parser.add_argument('--metrics-json', default=None, help="write the per-table request metrics as JSON here")
+    parser.add_argument('--metrics-prom', default=None, help="write the request metrics in Prometheus text format here")
+    args = parser.parse_args()
+    if args.use_async:
+        # the asyncio client only creates projects
+        unsupported = [name for name, given in [('load', args.command == 'load'), ('--run-id', args.run_id),
+                                                ('--rpc', args.rpc), ('--copy', args.copy),
+                                                ('--accounts', args.accounts)] if given]
+        if unsupported:
+            parser.error(f"--use-async does not support {', '.join(unsupported)}")
+
+    rs.path, rs.size = args.sentence_pool, args.sentence_pool_size
+    if args.refresh_sentences:
+        rs.refresh()
+
+    if args.command == 'generate':
+        # no network needed for this stage
+        write_plan(args.plan, count=args.count, seed=args.seed)
+        return
+
+    run_id = new_run_id() if args.run_id == 'new' else args.run_id
+    metrics = RequestMetrics()
+    try:
+        run(args, run_id, metrics)
+    finally:
+        metrics.print_summary()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+
+def run(args, run_id, metrics):
+    if args.command == 'teardown':
+        teardown(args, run_id, metrics)
+        return
+
+    run_tag = (run_id or new_run_id()) if args.tag_run else None
+    if run_tag:
+        print(f"Tagging rows with seed_run_id {run_tag}; remove them with: "
+              f"python main-create-projects.py teardown --run-id {run_tag}")
+    if args.accounts and args.command == 'create':
+        # every process signs in as its own account, no shared login here
+        accounts = load_accounts(args.accounts, args.cluster_ids.split(',') if args.cluster_ids else None)
+        seed_sharded(accounts, count=args.count, processes=args.processes, seed=args.seed, run_id=run_id,
+                     manifest_path=args.manifest, batch_projects=args.batch_projects, workers=args.workers,
+                     chunk_size=args.chunk_size, max_in_flight=args.max_in_flight, token_file=SESSION['token_file'],
+                     sentence_pool=args.sentence_pool, sentence_pool_size=args.sentence_pool_size, metrics=metrics,
+                     run_tag=run_tag)
+        return
+
+    tester = WebsiteTester(metrics)
     tester.login()
-    S = SupabaseClient(tester.config)
-    S.create_project()
+    if args.copy:
+        copy_projects(tester.config, args, run_id, run_tag, metrics)
+        return
+    if args.use_async:
+        asyncio.run(create_projects_async(tester.config, args, run_tag, metrics))
+        return
+    S = SupabaseClient(tester.config, chunk_size=args.chunk_size, verbose=args.verbose,
+                       max_in_flight=args.max_in_flight, metrics=metrics, use_rpc=args.rpc, run_tag=run_tag)
+    manifest = RunManifest(args.manifest) if run_id else None
+    if args.command == 'load':
+        S.load_plan(args.plan, batch_projects=args.batch_projects, workers=args.workers,
+                    run_id=run_id, manifest=manifest)
+    elif run_id:
+        S.seed_run(run_id, count=args.count, seed=args.seed, batch_projects=args.batch_projects,
+                   workers=args.workers, manifest=manifest)
+    else:
+        S.create_project(count=args.count, workers=args.workers, batch_projects=args.batch_projects if args.rpc else 1)
+
+def teardown(args, run_id, metrics):
+    if not run_id:
+        raise SystemExit("teardown needs the --run-id of the run to delete")
+    if args.direct:
+        teardown_run_direct(run_id, args.database_url)
+    else:
+        tester = WebsiteTester(metrics)
+        tester.login()
+        S = SupabaseClient(tester.config, max_in_flight=args.max_in_flight, metrics=metrics)
+        teardown_run(S, run_id, batch_size=args.delete_batch, workers=args.workers)
+    # a rerun with the same id starts from scratch
+    RunManifest(args.manifest).forget(run_id)
+
+def copy_projects(config, args, run_id, run_tag, metrics):
+    loader = CopyLoader(config, args.database_url, metrics=metrics, run_tag=run_tag)
+    manifest = RunManifest(args.manifest) if run_id else None
+    try:
+        if args.command == 'load':
+            loader.load_plan(args.plan, batch_projects=args.batch_projects, run_id=run_id, manifest=manifest)
+        else:
+            loader.seed(count=args.count, seed=args.seed, batch_projects=args.batch_projects,
+                        run_id=run_id, manifest=manifest)
+    finally:
+        loader.close()
+
+async def create_projects_async(config, args, run_tag = None, metrics = None):
+    S = await AsyncSupabaseClient.create(config, chunk_size=args.chunk_size, verbose=args.verbose,
+                                         concurrency=args.workers, metrics=metrics, run_tag=run_tag)
+    await S.create_project(count=args.count)
 
 if __name__ == '__main__':
     main()
-    
\ No newline at end of file
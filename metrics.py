@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from urllib.parse import urlsplit
+
+"""
+Request metrics for seeding runs.
+
+Every PostgREST and auth call is recorded under its (table, operation): a
+latency histogram, rows written or read, request payload bytes, errors and
+retries. Plain HTTP calls made through a requests.Session (the website
+tester, image uploads and checks) are recorded the same way once the session
+goes through instrument_session(). At the end of a run the metrics are printed, and can be written as a
+JSON summary and as a Prometheus text file (for node_exporter's textfile
+collector, or just to diff between runs).
+
+Metrics of worker processes are merged with snapshot() / merge().
+"""
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# PostgREST operation of a request, by HTTP method
+OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def describe_request(query) -> tuple:
+    """(table, operation, rows sent, payload bytes) of a built postgrest query"""
+    request = query.request
+    table = str(request.path).rsplit('/', 1)[-1]
+    operation = OPERATIONS.get(request.http_method, request.http_method.lower())
+    if '/rpc/' in str(request.path):
+        operation = "rpc"
+    elif operation == "insert" and 'merge-duplicates' in request.headers.get('prefer', ''):
+        operation = "upsert"
+    body = request.json if request.http_method != "GET" else None
+    rows = len(body) if isinstance(body, list) else int(bool(body))
+    payload_bytes = len(json.dumps(body, default=str)) if body else 0
+    return table, operation, rows, payload_bytes
+
+
+def instrument_session(session, metrics, table = None, operations = OPERATIONS):
+    """
+    Record every request of a requests.Session in metrics. table defaults to
+    the last segment of the url path, and the operation comes from the HTTP
+    method through `operations`. Answers of 400 and up count as errors.
+    Returns the session.
+    """
+    send = session.request
+
+    def request(method, url, *args, **kwargs):
+        name = table or urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1]
+        operation = operations.get(method.upper(), method.lower())
+        started = time.perf_counter()
+        try:
+            response = send(method, url, *args, **kwargs)
+        except Exception:
+            metrics.record(name, operation, time.perf_counter() - started, error=True)
+            raise
+        body = response.request.body
+        metrics.record(name, operation, time.perf_counter() - started, payload_bytes=len(body or b''),
+                       error=response.status_code >= 400)
+        return response
+
+    session.request = request
+    return session
+
+
+def new_series() -> dict:
+    return {
+        "requests": 0, "errors": 0, "retries": 0, "rows": 0, "payload_bytes": 0,
+        "seconds": 0.0, "max_seconds": 0.0, "buckets": [0] * (len(BUCKETS) + 1),
+    }
+
+
+def histogram_quantile(buckets, fraction):
+    """Estimate a quantile from bucket counts, interpolating inside the bucket like Prometheus does"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if seen + count >= rank and count:
+            lower = BUCKETS[i - 1] if i > 0 else 0
+            upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return BUCKETS[-1]
+
+
+class RequestMetrics:
+
+    def __init__(self, namespace = 'seeder'):
+        self.namespace = namespace
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self._series = {}       # (table, operation) -> series dict
+        self._lock = threading.Lock()
+
+    def record(self, table, operation, seconds, rows = 0, payload_bytes = 0, error = False, retries = 0):
+        bucket = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._series.get((table, operation))
+            if series is None:
+                series = self._series[(table, operation)] = new_series()
+            series['requests'] += 1
+            series['errors'] += bool(error)
+            series['retries'] += retries
+            series['rows'] += rows
+            series['payload_bytes'] += payload_bytes
+            series['seconds'] += seconds
+            series['max_seconds'] = max(series['max_seconds'], seconds)
+            series['buckets'][bucket] += 1
+
+    def snapshot(self) -> dict:
+        """Picklable copy of the raw series, for merging into another process's metrics"""
+        with self._lock:
+            return {f"{table}\t{operation}": dict(series, buckets=list(series['buckets']))
+                    for (table, operation), series in self._series.items()}
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, other in snapshot.items():
+                table, operation = key.split('\t')
+                series = self._series.setdefault((table, operation), new_series())
+                for name in ('requests', 'errors', 'retries', 'rows', 'payload_bytes', 'seconds'):
+                    series[name] += other[name]
+                series['max_seconds'] = max(series['max_seconds'], other['max_seconds'])
+                series['buckets'] = [a + b for a, b in zip(series['buckets'], other['buckets'])]
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        tables = []
+        for (table, operation), series in sorted(self.snapshot_items()):
+            requests = series['requests']
+            tables.append({
+                "table":          table,
+                "operation":      operation,
+                "requests":       requests,
+                "errors":         series['errors'],
+                "retries":        series['retries'],
+                "rows":           series['rows'],
+                "payload_bytes":  series['payload_bytes'],
+                "rows_per_s":     series['rows'] / elapsed if elapsed else None,
+                "busy_seconds":   series['seconds'],
+                "mean_ms":        1000 * series['seconds'] / requests if requests else None,
+                "p50_ms":         _ms(histogram_quantile(series['buckets'], 0.50)),
+                "p95_ms":         _ms(histogram_quantile(series['buckets'], 0.95)),
+                "p99_ms":         _ms(histogram_quantile(series['buckets'], 0.99)),
+                "max_ms":         1000 * series['max_seconds'],
+            })
+        return {
+            "started_at":      self.started_at.isoformat(),
+            "elapsed_seconds": elapsed,
+            "requests":        sum(row['requests'] for row in tables),
+            "errors":          sum(row['errors'] for row in tables),
+            "retries":         sum(row['retries'] for row in tables),
+            "rows":            sum(row['rows'] for row in tables),
+            "payload_bytes":   sum(row['payload_bytes'] for row in tables),
+            "tables":          tables,
+        }
+
+    def snapshot_items(self) -> list:
+        with self._lock:
+            return [(key, dict(series, buckets=list(series['buckets']))) for key, series in self._series.items()]
+
+    def print_summary(self):
+        summary = self.summary()
+        print("\n" + "="*96)
+        print(f"REQUEST METRICS: {summary['requests']} requests, {summary['rows']} rows, "
+              f"{summary['payload_bytes'] / 1e6:.1f} MB sent in {summary['elapsed_seconds']:.1f}s "
+              f"({summary['errors']} errors, {summary['retries']} retries)")
+        print("="*96)
+        print(f"{'table':<26}{'op':<8}{'reqs':>7}{'err':>5}{'retry':>6}{'rows':>9}{'rows/s':>9}{'MB':>7}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for row in summary['tables']:
+            print(f"{row['table']:<26}{row['operation']:<8}{row['requests']:>7}{row['errors']:>5}{row['retries']:>6}"
+                  f"{row['rows']:>9}{row['rows_per_s']:>9.1f}{row['payload_bytes'] / 1e6:>7.2f}"
+                  f"{row['p50_ms'] or 0:>9.1f}{row['p95_ms'] or 0:>9.1f}{row['p99_ms'] or 0:>9.1f}")
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), indent=2))
+        print(f"Metrics summary written to {path}")
+
+    def write_prometheus(self, path):
+        """Prometheus text exposition format"""
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_request_duration_seconds PostgREST/auth/HTTP request latency by table and operation",
+            f"# TYPE {ns}_request_duration_seconds histogram",
+        ]
+        items = sorted(self.snapshot_items())
+        for (table, operation), series in items:
+            labels = f'table="{table}",operation="{operation}"'
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS) + ['+Inf'], series['buckets']):
+                cumulative += count
+                lines.append(f'{ns}_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{ns}_request_duration_seconds_sum{{{labels}}} {series['seconds']}")
+            lines.append(f"{ns}_request_duration_seconds_count{{{labels}}} {series['requests']}")
+        for name, field, help_text in [
+            ("rows_total",          "rows",          "rows written or read"),
+            ("payload_bytes_total", "payload_bytes", "request body bytes sent"),
+            ("errors_total",        "errors",        "requests that failed after any retries"),
+            ("retries_total",       "retries",       "requests retried after a connection error"),
+        ]:
+            lines.append(f"# HELP {ns}_{name} {help_text}")
+            lines.append(f"# TYPE {ns}_{name} counter")
+            for (table, operation), series in items:
+                lines.append(f'{ns}_{name}{{table="{table}",operation="{operation}"}} {series[field]}')
+        lines.append(f"# HELP {ns}_run_seconds wall time of the run")
+        lines.append(f"# TYPE {ns}_run_seconds gauge")
+        lines.append(f"{ns}_run_seconds {time.perf_counter() - self.started}")
+        _write_atomic(path, "\n".join(lines) + "\n")
+        print(f"Prometheus metrics written to {path}")
+
+
+def _ms(seconds):
+    return None if seconds is None else 1000 * seconds
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,504 @@
+import hashlib
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+from sentencepool import SentencePool
+from vehiclecatalog import load_catalog
+
+"""
+Offline project generation. Everything here is pure data: no network calls,
+so a whole seeding run can be generated at CPU speed into a JSONL plan and
+loaded later (see SupabaseClient.load_plan).
+"""
+
+# stands in for wonderwords.RandomSentence; configure size/refresh before first use
+rs = SentencePool()
+
+# child tables depend on the ones before them, load in this order
+PLAN_TABLES = [
+    "projects",
+    "project_phases",
+    "project_tasks",
+    "project_components",
+    "project_timeline_entries",
+]
+
+PROJECT_STATUSES = ["Planning", "In Progress", "Completed", "On Hold"]
+PHASE_STATUSES = ["pending", "in_progress", "completed"]
+TASK_STATUSES = ["pending", "completed"]
+TASK_PRIORITIES = ["low", "medium", "high"]
+COMPONENT_STATUSES = ["ordered", "installed", "received", "tested"]
+ENTRY_TYPES = ["progress", "photo", "milestone", "note", "issue", "solution"]
+
+# namespace of the ids of generated rows (ProjectPlanner.new_ids)
+PLAN_NAMESPACE = uuid.UUID("6f1c9a52-3d1e-4b8a-9a43-2f7e5c0d8b61")
+
+def hosted_vehicles(dataset_json='car_dataset.json'):
+    """
+    The vehicles with a hosted image, as an O(1)-indexable sequence backed by
+    the compiled catalog (rebuilt only when the JSON changes).
+    """
+    return load_catalog(dataset_json).hosted
+
+
+class ProjectRecords:
+    """
+    Builds the rows of a project graph from lists.json without touching the
+    network, so the sync and async clients generate identical data.
+    Expects self.data, self.SESSION and self.verbose to be set.
+    """
+    reference_date = None   # dates are relative to this, or to now() if unset
+    dataset_json = 'car_dataset.json'
+    run_tag = None          # seed_run_id written on every row, for teardown
+    catalog = None          # VehicleCatalog of the current run, see open_catalog()
+
+    def open_catalog(self):
+        """
+        Take the vehicle catalog for a run. The run keeps sampling from this one,
+        even if the dataset is rewritten (and the catalog recompiled) meanwhile.
+        """
+        self.catalog = load_catalog(self.dataset_json)
+        return self.catalog
+
+    def tag(self, rows) -> list:
+        """Stamp rows with the run tag, if there is one"""
+        if self.run_tag:
+            for row in rows:
+                row['seed_run_id'] = self.run_tag
+        return rows
+
+    def now(self) -> datetime:
+        return self.reference_date or datetime.now()
+
+    def build_project_record(self, vehicle) -> dict:
+        target_motors = self.data['target_motors']
+        vehicle_make = vehicle['make']
+        vehicle_model = vehicle['model']
+        vehicle_year = vehicle['year']
+        image_url = vehicle['hosted_url']
+        new_project_name = f"{vehicle_year} {vehicle_make} {vehicle_model} ({random.randint(1000,9999)})"
+        return {
+            "user_id":              self.SESSION['user_id'],
+            "cluster_id":           self.SESSION.get('cluster_id') or os.getenv("TODO_CLUSTER_ID"),
+            "project_title":        new_project_name,
+            "vehicle_make":         vehicle_make,
+            "vehicle_model":        vehicle_model,
+            "vehicle_year":         vehicle_year,
+            "vision_statement":     rs.simple_sentence() + " " + rs.simple_sentence() + " " + rs.simple_sentence(),
+            "target_range":         random.randint(5, 100) * 10,
+            "target_motor":         random.choice(target_motors),
+            "target_battery_kwh":   random.randint(20, 200),
+            "target_budget":        "$30K - $50K",
+            "project_image_url":    image_url,
+            "project_status":       random.choice(PROJECT_STATUSES)
+        }
+
+    def build_project_graph(self, vehicle) -> dict:
+        """
+        A whole project in the nested form create_project_graphs takes, with no
+        ids: the database assigns them and links the rows from the nesting.
+        """
+        phases = self.build_phase_records(None)
+        tasks = self.build_task_records({phase['phase_order']: phase['phase_order'] for phase in phases})
+        for phase in phases:
+            del phase['project_id']
+            phase['tasks'] = [task for task in tasks if task['phase_id'] == phase['phase_order']]
+        for task in tasks:
+            del task['phase_id']
+
+        components = self.build_component_records(None)
+        entries = self.build_timeline_records(None, vehicle=vehicle)
+        for row in components + entries:
+            del row['project_id']
+        return {
+            "project":          self.tag([self.build_project_record(vehicle)])[0],
+            "phases":           phases,
+            "components":       components,
+            "timeline_entries": entries,
+        }
+
+    def build_phase_records(self, project_id) -> list:
+        records = []
+        for i, phase in enumerate(self.data['project_phases'], start=1):
+            records.append({
+                "phase_name":   phase['title'],
+                "description":  phase['description'],
+                "project_id":   project_id,
+                "phase_order":  i,
+                "status":       random.choice(PHASE_STATUSES)
+            })
+            if self.verbose:
+                print(f"  - Adding conversion phase: {phase['title']}")
+        return records
+
+    def build_task_records(self, phase_ids) -> list:
+        """phase_ids maps phase_order to the id of the inserted project_phases row"""
+        records = []
+        for i, phase in enumerate(self.data['project_phases'], start=1):
+            for task_order, each_task in enumerate(phase['subtasks'], start=1):
+                records.append({
+                    "task_name":        each_task,
+                    "phase_id":         phase_ids[i],
+                    "status":           random.choice(TASK_STATUSES),
+                    "priority":         random.choice(TASK_PRIORITIES),
+                    "estimated_hours":  random.randint(1, 20),
+                    "task_order":       task_order
+                })
+                if self.verbose:
+                    print(f"    - Adding conversion task: {each_task}")
+        return records
+
+    def build_component_records(self, project_id, count = 24) -> list:
+        components = self.data['components']  
+        vendors = self.data['ev_conversion_vendors']
+        component_types = self.data['component_types']
+
+        records = []
+        for _ in range(count):
+            dt =  self.now() + timedelta(days=random.randint(-30, 30))
+            record = {
+                "project_id":           project_id,
+                "component_name":       random.choice(components),
+                "category":             random.choice(component_types),
+                "vendor":               random.choice(vendors),
+                "expected_delivery":    dt.isoformat(),
+                "estimated_cost":       random.randint(100, 5000),
+                "notes":                rs.simple_sentence(),
+                "status":               random.choice(COMPONENT_STATUSES),
+                "model_number":         f"MDL-{random.randint(100,999)}",
+            }
+            if self.verbose:
+                print(f" ~ Adding Component entry: {record['component_name']}")
+            records.append(record)
+        return records
+
+    def build_timeline_records(self, project_id, count = 15, vehicle = None) -> list:
+        """
+        With a vehicle the photos come from the hosted images of that vehicle
+        (or its nearest relatives); without one, from the generic lists.json set.
+        """
+        if vehicle:
+            photos = (self.catalog or self.open_catalog()).sample_images(
+                vehicle['make'], vehicle['model'], vehicle['year'], count)
+        else:
+            photos = [random.choice(self.data['images']) for _ in range(count)]
+
+        records = []
+        for photo_url in photos:
+            record = {
+                "project_id":   project_id,
+                "entry_type":   random.choice(ENTRY_TYPES),
+                "title":        rs.simple_sentence(),
+                "description":  rs.sentence() + "\n" + rs.sentence(),
+                "photo_url":    photo_url,
+                "created_by":   self.SESSION['user_id']
+            }
+            if self.verbose:
+                print(f"  - Adding project timeline entry: {record['title']}")
+            records.append(record)
+        return records
+
+
+class ProjectTemplate:
+    """
+    lists.json compiled once per run into flat arrays: every task of every
+    phase is laid out in order with its phase and task_order precomputed, so
+    a project graph is just these arrays zipped with a block of random draws.
+    """
+
+    def __init__(self, data:dict):
+        self.phase_titles = [phase['title'] for phase in data['project_phases']]
+        self.phase_descriptions = [phase['description'] for phase in data['project_phases']]
+        self.task_names = []
+        self.task_phase = []        # position of the task's phase in phase_titles
+        self.task_order = []
+        for p, phase in enumerate(data['project_phases']):
+            for task_order, task_name in enumerate(phase['subtasks'], start=1):
+                self.task_names.append(task_name)
+                self.task_phase.append(p)
+                self.task_order.append(task_order)
+
+        self.components = data['components']
+        self.vendors = data['ev_conversion_vendors']
+        self.component_types = data['component_types']
+        self.target_motors = data['target_motors']
+
+
+class ProjectPlanner:
+    """
+    Generates complete project graphs with client-side ids. Project n of a
+    given seed is always the same graph, whatever else is generated around it.
+
+    Numeric and categorical fields are drawn with NumPy for a block of
+    BLOCK_SIZE projects at a time, from a generator seeded by (seed, block).
+    Photos come from a random.Random seeded per project.
+
+    user_id, cluster_id and created_by are left empty in the plan, so that the
+    same plan can be loaded into any environment; the loader fills them in.
+    """
+
+    BLOCK_SIZE = 1024
+    components_per_project = 24
+    timeline_entries_per_project = 15
+    dataset_json = 'car_dataset.json'
+
+    def __init__(self, seed:int = None, vehicles:list = None, reference_date:datetime = None):
+        self.template = ProjectTemplate(json.load(open('lists.json')))
+        # one catalog for the planner's lifetime, even if the JSON is rewritten meanwhile
+        self.catalog = load_catalog(self.dataset_json)
+        self.vehicles = vehicles if vehicles is not None else self.catalog.hosted
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.reference_date = reference_date or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @property
+    def reference_date(self) -> datetime:
+        return self._reference_date
+
+    @reference_date.setter
+    def reference_date(self, value:datetime):
+        self._reference_date = value
+        # expected_delivery only takes 61 distinct values, format them once
+        self._delivery_dates = {days: (value + timedelta(days=days)).isoformat() for days in range(-30, 31)}
+
+    @property
+    def seed(self) -> int:
+        return self._seed
+
+    @seed.setter
+    def seed(self, value:int):
+        self._seed = value
+        self._id_prefix = PLAN_NAMESPACE.bytes + f"{value}:".encode()
+
+    def new_id(self, index:int, table:str, n:int = 0) -> str:
+        """
+        Ids depend only on the seed and the row's place in the graph, never on
+        the random stream, so a rerun addresses exactly the same rows.
+        """
+        return self.new_ids(index, table, n + 1)[n]
+
+    def new_ids(self, index:int, table:str, count:int) -> list:
+        """
+        new_id of rows 0..count-1 of a table, all cut from one SHAKE-128 stream
+        of (namespace, seed, index, table): one hash per table and project
+        instead of one per row. Row n gets the same id whatever the count.
+        """
+        raw = bytearray(hashlib.shake_128(self._id_prefix + f"{index}:{table}".encode()).digest(16 * count))
+        octets = np.frombuffer(raw, dtype=np.uint8)
+        octets[6::16] = octets[6::16] & 0x0F | 0x80     # version 8, custom
+        octets[8::16] = octets[8::16] & 0x3F | 0x80     # RFC 4122 variant
+        h = raw.hex()
+        return [f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+                for i in range(0, 32 * count, 32)]
+
+    def project_graph(self, index:int) -> dict:
+        return next(self.project_graphs(index, index + 1))
+
+    def project_graphs(self, start:int, stop:int, wanted = None):
+        """
+        Yield the graphs of projects start..stop-1, skipping any index for
+        which wanted(index) is false.
+        """
+        for block in range(start // self.BLOCK_SIZE, (stop - 1) // self.BLOCK_SIZE + 1):
+            first = block * self.BLOCK_SIZE
+            indexes = [i for i in range(max(start, first), min(stop, first + self.BLOCK_SIZE))
+                       if wanted is None or wanted(i)]
+            if not indexes:
+                continue
+            draws = self._draw_block(block)
+            for index in indexes:
+                yield self._build_graph(index, index - first, draws)
+
+    def _draw_block(self, block:int) -> dict:
+        t = self.template
+        rng = np.random.default_rng([self.seed, block])
+        n = self.BLOCK_SIZE
+        phases, tasks = len(t.phase_titles), len(t.task_names)
+        components, entries = self.components_per_project, self.timeline_entries_per_project
+
+        draws = {
+            "vehicle":              rng.integers(len(self.vehicles), size=n),
+            "title_suffix":         rng.integers(1000, 10000, size=n),
+            "target_range":         rng.integers(5, 101, size=n) * 10,
+            "target_motor":         rng.integers(len(t.target_motors), size=n),
+            "target_battery_kwh":   rng.integers(20, 201, size=n),
+            "project_status":       rng.integers(len(PROJECT_STATUSES), size=n),
+            "phase_status":         rng.integers(len(PHASE_STATUSES), size=(n, phases)),
+            "task_status":          rng.integers(len(TASK_STATUSES), size=(n, tasks)),
+            "task_priority":        rng.integers(len(TASK_PRIORITIES), size=(n, tasks)),
+            "estimated_hours":      rng.integers(1, 21, size=(n, tasks)),
+            "component_name":       rng.integers(len(t.components), size=(n, components)),
+            "component_category":   rng.integers(len(t.component_types), size=(n, components)),
+            "component_vendor":     rng.integers(len(t.vendors), size=(n, components)),
+            "delivery_days":        rng.integers(-30, 31, size=(n, components)),
+            "estimated_cost":       rng.integers(100, 5001, size=(n, components)),
+            "component_status":     rng.integers(len(COMPONENT_STATUSES), size=(n, components)),
+            "model_number":         rng.integers(100, 1000, size=(n, components)),
+            "entry_type":           rng.integers(len(ENTRY_TYPES), size=(n, entries)),
+            "vision_statement":     rng.integers(rs.size, size=(n, 3)),
+            "component_notes":      rng.integers(rs.size, size=(n, components)),
+            "entry_title":          rng.integers(rs.size, size=(n, entries)),
+            "entry_description":    rng.integers(rs.size, size=(n, entries, 2)),
+        }
+        # plain Python ints from here on, both for speed and for json.dumps
+        return {name: values.tolist() for name, values in draws.items()}
+
+    def _build_graph(self, index:int, row:int, draws:dict) -> dict:
+        t = self.template
+        simple, sentences = rs.simple_sentences, rs.sentences
+        # photos are sampled from a generator of the project's own
+        rng = random.Random(f"{self.seed}:{index}")
+
+        vehicle = self.vehicles[draws['vehicle'][row]]
+        project_id = self.new_id(index, "projects")
+        project = {
+            "id":                   project_id,
+            "user_id":              None,
+            "cluster_id":           None,
+            "project_title":        f"{vehicle['year']} {vehicle['make']} {vehicle['model']} ({draws['title_suffix'][row]})",
+            "vehicle_make":         vehicle['make'],
+            "vehicle_model":        vehicle['model'],
+            "vehicle_year":         vehicle['year'],
+            "vision_statement":     " ".join(simple[i] for i in draws['vision_statement'][row]),
+            "target_range":         draws['target_range'][row],
+            "target_motor":         t.target_motors[draws['target_motor'][row]],
+            "target_battery_kwh":   draws['target_battery_kwh'][row],
+            "target_budget":        "$30K - $50K",
+            "project_image_url":    vehicle['hosted_url'],
+            "project_status":       PROJECT_STATUSES[draws['project_status'][row]],
+        }
+
+        phase_ids = self.new_ids(index, "project_phases", len(t.phase_titles))
+        phase_status = draws['phase_status'][row]
+        phases = [{
+            "id":           phase_ids[p],
+            "phase_name":   t.phase_titles[p],
+            "description":  t.phase_descriptions[p],
+            "project_id":   project_id,
+            "phase_order":  p + 1,
+            "status":       PHASE_STATUSES[phase_status[p]],
+        } for p in range(len(t.phase_titles))]
+
+        task_status, priority, hours = draws['task_status'][row], draws['task_priority'][row], draws['estimated_hours'][row]
+        task_ids = self.new_ids(index, "project_tasks", len(t.task_names))
+        tasks = [{
+            "id":               task_ids[k],
+            "task_name":        t.task_names[k],
+            "phase_id":         phase_ids[t.task_phase[k]],
+            "status":           TASK_STATUSES[task_status[k]],
+            "priority":         TASK_PRIORITIES[priority[k]],
+            "estimated_hours":  hours[k],
+            "task_order":       t.task_order[k],
+        } for k in range(len(t.task_names))]
+
+        name, category, vendor = draws['component_name'][row], draws['component_category'][row], draws['component_vendor'][row]
+        days, cost, status, model = draws['delivery_days'][row], draws['estimated_cost'][row], draws['component_status'][row], draws['model_number'][row]
+        notes = draws['component_notes'][row]
+        component_ids = self.new_ids(index, "project_components", self.components_per_project)
+        components = [{
+            "id":                   component_ids[k],
+            "project_id":           project_id,
+            "component_name":       t.components[name[k]],
+            "category":             t.component_types[category[k]],
+            "vendor":               t.vendors[vendor[k]],
+            "expected_delivery":    self._delivery_dates[days[k]],
+            "estimated_cost":       cost[k],
+            "notes":                simple[notes[k]],
+            "status":               COMPONENT_STATUSES[status[k]],
+            "model_number":         f"MDL-{model[k]}",
+        } for k in range(self.components_per_project)]
+
+        entry_type, title, description = draws['entry_type'][row], draws['entry_title'][row], draws['entry_description'][row]
+        photos = self.catalog.sample_images(
+            vehicle['make'], vehicle['model'], vehicle['year'], self.timeline_entries_per_project, rng=rng)
+        entry_ids = self.new_ids(index, "project_timeline_entries", len(photos))
+        timeline_entries = [{
+            "id":           entry_ids[k],
+            "project_id":   project_id,
+            "entry_type":   ENTRY_TYPES[entry_type[k]],
+            "title":        simple[title[k]],
+            "description":  sentences[description[k][0]] + "\n" + sentences[description[k][1]],
+            "photo_url":    photo_url,
+            "created_by":   None,
+        } for k, photo_url in enumerate(photos)]
+
+        return {
+            "index":                    index,
+            "projects":                 [project],
+            "project_phases":           phases,
+            "project_tasks":            tasks,
+            "project_components":       components,
+            "project_timeline_entries": timeline_entries,
+        }
+
+
+def nest_graph(graph) -> dict:
+    """
+    A flat plan graph in the nested form create_project_graphs takes: tasks
+    under their phase, everything else under the project.
+    """
+    tasks = {}
+    for task in graph['project_tasks']:
+        tasks.setdefault(task['phase_id'], []).append(task)
+    return {
+        "project":          graph['projects'][0],
+        "phases":           [dict(phase, tasks=tasks.get(phase['id'], [])) for phase in graph['project_phases']],
+        "components":       graph['project_components'],
+        "timeline_entries": graph['project_timeline_entries'],
+    }
+
+
+def assign_owner(graphs, user_id, cluster_id = None, run_tag = None):
+    """
+    Fill in the user and cluster a plan leaves empty, keeping any already set,
+    and stamp every row with the run tag if there is one
+    """
+    for graph in graphs:
+        for project in graph['projects']:
+            project['user_id'] = project.get('user_id') or user_id
+            project['cluster_id'] = project.get('cluster_id') or cluster_id
+        for entry in graph['project_timeline_entries']:
+            entry['created_by'] = entry.get('created_by') or user_id
+        if run_tag:
+            for table in PLAN_TABLES:
+                for row in graph[table]:
+                    row['seed_run_id'] = run_tag
+
+
+def write_plan(plan_path, count = 10, seed:int = None, start:int = 0) -> ProjectPlanner:
+    """
+    Generate count project graphs into a JSONL plan file: a header line with the
+    seed, then one line per project graph.
+    """
+    planner = ProjectPlanner(seed=seed)
+    with open(plan_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({
+            "seed":             planner.seed,
+            "count":            count,
+            "start":            start,
+            "reference_date":   planner.reference_date.isoformat(),
+            "generated_at":     datetime.now().isoformat(),
+        }) + "\n")
+        for done, graph in enumerate(planner.project_graphs(start, start + count), start=1):
+            f.write(json.dumps(graph, ensure_ascii=False) + "\n")
+            if done % 1000 == 0:
+                print(f"  ~ Generated {done}/{count} projects")
+
+    print(f"Plan written to {plan_path} ({count} projects, seed {planner.seed})")
+    return planner
+
+
+def read_plan_header(plan_path) -> dict:
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        return json.loads(f.readline())
+
+
+def read_plan(plan_path):
+    """Yield the project graphs of a plan file one at a time, skipping the header"""
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        f.readline()
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,112 @@
+import random
+import sqlite3
+import threading
+from datetime import datetime
+from projectplan import PLAN_TABLES
+
+"""
+Checkpoint manifest for seeding runs, kept in a local SQLite file.
+
+Every project of a run is identified by its plan index. Its stage is the number
+of PLAN_TABLES whose rows are known to have landed, so a project at stage
+len(PLAN_TABLES) is complete and a project with no row was never attempted.
+"""
+
+COMPLETE = len(PLAN_TABLES)
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{random.getrandbits(24):06x}"
+
+
+class RunManifest:
+
+    def __init__(self, path = 'seed-manifest.sqlite'):
+        self.path = path
+        # shared by the worker threads of a run, so serialise access ourselves
+        self._lock = threading.Lock()
+        # and by the shard processes of a sharded run: WAL lets them read while
+        # one writes, and writers wait their turn instead of failing as locked
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id      TEXT PRIMARY KEY,
+                    seed        INTEGER NOT NULL,
+                    count       INTEGER NOT NULL,
+                    reference_date TEXT NOT NULL,
+                    source      TEXT,
+                    started_at  TEXT NOT NULL,
+                    finished_at TEXT
+                )""")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    run_id      TEXT NOT NULL,
+                    idx         INTEGER NOT NULL,
+                    project_id  TEXT,
+                    stage       INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (run_id, idx)
+                )""")
+
+    def start_run(self, run_id, seed, count, reference_date, source = None) -> dict:
+        """
+        Register a run, or return the existing one so a restart reuses its seed
+        and reference date.
+        """
+        run = self.get_run(run_id)
+        if run:
+            print(f"Resuming run {run_id} (seed {run['seed']}, {self.completed(run_id)}/{run['count']} projects complete)")
+            return run
+
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT INTO runs (run_id, seed, count, reference_date, source, started_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, seed, count, reference_date.isoformat(), source, datetime.now().isoformat()))
+        print(f"Started run {run_id} (seed {seed}, {count} projects)")
+        return self.get_run(run_id)
+
+    def get_run(self, run_id) -> dict:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT run_id, seed, count, reference_date, source, started_at, finished_at FROM runs WHERE run_id = ?",
+                (run_id,)).fetchone()
+        if not row:
+            return None
+        run = dict(zip(['run_id', 'seed', 'count', 'reference_date', 'source', 'started_at', 'finished_at'], row))
+        run['reference_date'] = datetime.fromisoformat(run['reference_date'])
+        return run
+
+    def finish_run(self, run_id):
+        with self._lock, self.db:
+            self.db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (datetime.now().isoformat(), run_id))
+
+    def forget(self, run_id):
+        """Drop a run and its checkpoints, after its rows were torn down"""
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM projects WHERE run_id = ?", (run_id,))
+            self.db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def stages(self, run_id) -> dict:
+        """Map of plan index -> stage for every project of the run that was attempted"""
+        with self._lock:
+            rows = self.db.execute("SELECT idx, stage FROM projects WHERE run_id = ?", (run_id,)).fetchall()
+        return dict(rows)
+
+    def completed(self, run_id) -> int:
+        with self._lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM projects WHERE run_id = ? AND stage >= ?", (run_id, COMPLETE)).fetchone()[0]
+
+    def begin(self, run_id, projects):
+        """Record that these (index, project_id) pairs are about to be written"""
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO projects (run_id, idx, project_id) VALUES (?, ?, ?)",
+                [(run_id, idx, project_id) for idx, project_id in projects])
+
+    def mark(self, run_id, indexes, stage):
+        with self._lock, self.db:
+            self.db.executemany(
+                "UPDATE projects SET stage = MAX(stage, ?) WHERE run_id = ? AND idx = ?",
+                [(stage, run_id, idx) for idx in indexes])
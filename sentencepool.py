@@ -0,0 +1,123 @@
+import json
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from processlock import file_lock
+
+"""
+Cached pool of wonderwords sentences.
+
+wonderwords takes milliseconds per sentence, which dominates generation once
+the network is out of the way. The pool generates `size` sentences of each
+kind once, keeps them in a JSON file and afterwards hands them out by index.
+It has the same simple_sentence()/sentence() interface as RandomSentence, so
+it can stand in for it directly. Processes that find the pool missing at the
+same time take turns on a lock file: the first fills it, the rest read it.
+"""
+
+
+class SentencePool:
+
+    def __init__(self, path = 'sentence-pool.json', size = 2000, max_age_days = None):
+        """
+        Args:
+            path: JSON file the pool is kept in
+            size: sentences of each kind to keep; a smaller stored pool is topped up
+            max_age_days: regenerate the whole pool once it is older than this (None = never)
+        """
+        self.path = path
+        self.size = size
+        self.max_age_days = max_age_days
+        self._simple = None
+        self._sentences = None
+        self._created_at = None
+        self._lock = threading.Lock()   # worker threads may all ask for the first sentence at once
+
+    @property
+    def simple_sentences(self) -> list:
+        self._load()
+        return self._simple
+
+    @property
+    def sentences(self) -> list:
+        self._load()
+        return self._sentences
+
+    def simple_sentence(self, rng = random) -> str:
+        pool = self.simple_sentences
+        return pool[rng.randrange(min(self.size, len(pool)))]
+
+    def sentence(self, rng = random) -> str:
+        pool = self.sentences
+        return pool[rng.randrange(min(self.size, len(pool)))]
+
+    def refresh(self):
+        """Throw the stored pool away and generate a new one"""
+        with self._lock, file_lock(self.path + ".lock"):
+            self._created_at = None
+            simple, sentences = [], []
+            self._fill(simple, sentences)
+            self._sentences, self._simple = sentences, simple
+
+    def _load(self):
+        if self._simple is not None:
+            return
+        with self._lock:
+            if self._simple is None:
+                self._read()
+
+    def _read(self):
+        simple, sentences = self._stored()
+        if len(simple) < self.size or len(sentences) < self.size:
+            with file_lock(self.path + ".lock"):
+                # another process may have filled it while we waited
+                simple, sentences = self._stored()
+                if len(simple) < self.size or len(sentences) < self.size:
+                    self._fill(simple, sentences)
+        # publish the lists last, _load() treats them as the "ready" flag
+        self._sentences, self._simple = sentences, simple
+
+    def _stored(self):
+        """The (simple_sentences, sentences) of the pool file, empty if missing or too old"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = None
+
+        if stored and self.max_age_days is not None:
+            age = datetime.now() - datetime.fromisoformat(stored['created_at'])
+            if age > timedelta(days=self.max_age_days):
+                print(f"Sentence pool {self.path} is {age.days} days old, regenerating")
+                stored = None
+
+        self._created_at = None
+        if not stored:
+            return [], []
+        self._created_at = stored['created_at']
+        return stored['simple_sentences'], stored['sentences']
+
+    def _fill(self, simple, sentences):
+        """Top both lists up to self.size and write them out"""
+        # only here is wonderwords needed, so only import it here
+        from wonderwords import RandomSentence
+        rs = RandomSentence()
+
+        missing = max(0, self.size - len(simple)) + max(0, self.size - len(sentences))
+        print(f"Generating {missing} sentences into {self.path}...")
+        while len(simple) < self.size:
+            simple.append(rs.simple_sentence())
+        while len(sentences) < self.size:
+            sentences.append(rs.sentence())
+
+        if self._created_at is None:
+            self._created_at = datetime.now().isoformat()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                "created_at":       self._created_at,
+                "simple_sentences": simple,
+                "sentences":        sentences,
+            }, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
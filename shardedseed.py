@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+"""
+Seed projects for many test accounts at once, one process per shard.
+
+The plan indexes 0..count-1 of one seed are split into contiguous shards. Every
+shard runs in its own process with its own SupabaseClient, signed in as one
+account of the pool (through the shared token cache) and tagging its projects
+with that account's cluster. Since a project only depends on its seed and
+index, the data is the same however it is sharded; with a run_id all shards
+checkpoint into the same run and a rerun resumes every shard.
+
+The accounts file is a JSON list:
+
+    [{"email": "a@example.com", "password": "...", "cluster_id": "..."}, ...]
+
+cluster_id is optional; accounts without one take the given cluster ids in turn.
+"""
+
+
+def load_accounts(accounts_path, cluster_ids = None) -> list:
+    with open(accounts_path, 'r', encoding='utf-8') as f:
+        accounts = json.load(f)
+    if not accounts:
+        raise ValueError(f"{accounts_path} lists no accounts")
+
+    cluster_ids = cluster_ids or [os.getenv("TODO_CLUSTER_ID")]
+    for i, account in enumerate(accounts):
+        account.setdefault('cluster_id', cluster_ids[i % len(cluster_ids)])
+    return accounts
+
+
+def plan_shards(count, processes, accounts) -> list:
+    """Split indexes 0..count-1 into `processes` contiguous shards, handing out accounts in turn"""
+    processes = max(1, min(processes, count))
+    shards = []
+    for i in range(processes):
+        start, stop = count * i // processes, count * (i + 1) // processes
+        shards.append({"shard": i, "start": start, "stop": stop, "account": accounts[i % len(accounts)]})
+    return shards
+
+
+def _seed_shard(shard, options) -> dict:
+    """Body of one worker process: sign in as the shard's account and load its indexes"""
+    from projectplan import rs
+    from runmanifest import RunManifest
+    from supabaseclient import SupabaseClient
+
+    rs.path, rs.size = options['sentence_pool'], options['sentence_pool_size']
+    account = shard['account']
+    config = {
+        'username':   account['email'],
+        'password':   account['password'],
+        'cluster_id': account.get('cluster_id'),
+        'token_file': options['token_file'],
+    }
+    started = time.perf_counter()
+    S = SupabaseClient(config, chunk_size=options['chunk_size'], max_in_flight=options['max_in_flight'],
+                       run_tag=options['run_tag'])
+    if options['run_id']:
+        loaded = S.seed_run(options['run_id'], count=options['count'], batch_projects=options['batch_projects'],
+                            workers=options['workers'], manifest=RunManifest(options['manifest']),
+                            start=shard['start'], stop=shard['stop'])
+    else:
+        loaded = S.seed_projects(shard['stop'] - shard['start'], seed=options['seed'], start=shard['start'],
+                                 batch_projects=options['batch_projects'], workers=options['workers'])
+    return {**shard, "loaded": loaded, "seconds": time.perf_counter() - started, "metrics": S.metrics.snapshot()}
+
+
+def seed_sharded(accounts, count = 10, processes = None, seed = None, run_id = None,
+                 manifest_path = 'seed-manifest.sqlite', batch_projects = 100, workers = 1,
+                 chunk_size = 500, max_in_flight = 8, token_file = 'auth-tokens.json',
+                 sentence_pool = 'sentence-pool.json', sentence_pool_size = 2000, metrics = None,
+                 run_tag = None) -> int:
+    """
+    Load count projects across `processes` worker processes (default: one per
+    account) and report each shard's and the aggregate throughput.
+
+    Args:
+        accounts: list of account dicts (see load_accounts)
+        seed: plan seed shared by all shards (random if not given, or the run's seed when resuming)
+        run_id: checkpoint into this run of the manifest, so a rerun resumes
+        workers: loader threads inside each process
+        metrics: optional RequestMetrics the shards' request metrics are merged into
+        run_tag: seed_run_id stamped on every row of every shard
+    Returns: projects loaded
+    """
+    from projectplan import ProjectPlanner, rs
+    from runmanifest import RunManifest
+    from vehiclecatalog import load_catalog
+
+    processes = processes or len(accounts)
+    if run_id:
+        # register the run once, so every shard agrees on the seed and reference date
+        seed = seed if seed is not None else random.randrange(2**32)
+        reference_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        run = RunManifest(manifest_path).start_run(run_id, seed, count, reference_date, source="seed_sharded")
+        seed, count = run['seed'], run['count']
+    elif seed is None:
+        seed = random.randrange(2**32)
+
+    options = {
+        "count": count, "seed": seed, "run_id": run_id, "manifest": manifest_path,
+        "batch_projects": batch_projects, "workers": workers, "chunk_size": chunk_size,
+        "max_in_flight": max_in_flight, "token_file": token_file,
+        "sentence_pool": sentence_pool, "sentence_pool_size": sentence_pool_size, "run_tag": run_tag,
+    }
+    shards = plan_shards(count, processes, accounts)
+
+    # build the sentence pool and the catalog here, once: shards that each
+    # generated their own pool would make the text depend on the sharding
+    rs.path, rs.size = sentence_pool, sentence_pool_size
+    rs.simple_sentences
+    load_catalog(ProjectPlanner.dataset_json)
+
+    print(f"Seeding {count} projects (seed {seed}) in {len(shards)} processes for {len(accounts)} accounts...")
+
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = {pool.submit(_seed_shard, shard, options): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"✗ Shard {shard['shard']} ({shard['account']['email']}) failed: {e}")
+                continue
+            results.append(result)
+            if metrics:
+                metrics.merge(result['metrics'])
+    elapsed = time.perf_counter() - started
+    if run_id and len(results) == len(shards):
+        RunManifest(manifest_path).finish_run(run_id)
+
+    loaded = sum(result['loaded'] for result in results)
+    print("\n" + "="*60)
+    print("SHARDED SEEDING COMPLETE")
+    print("="*60)
+    for result in sorted(results, key=lambda result: result['shard']):
+        print(f"  shard {result['shard']:>2} {result['account']['email']:<30} "
+              f"indexes {result['start']}-{result['stop'] - 1}: {result['loaded']} projects "
+              f"in {result['seconds']:.1f}s ({result['loaded'] / max(result['seconds'], 1e-9):.1f}/s)")
+    print(f"Loaded {loaded} projects in {elapsed:.1f}s: {loaded / max(elapsed, 1e-9):.1f} projects/s "
+          f"across {len(shards)} shards ({len(shards) - len(results)} failed)")
+    return loaded
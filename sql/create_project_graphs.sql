@@ -0,0 +1,151 @@
+-- create_project_graphs(graphs jsonb): insert whole project graphs in one
+-- transaction, called through PostgREST as POST /rest/v1/rpc/create_project_graphs
+-- (SupabaseClient.create_project_graphs). Install it once per project:
+--
+--     psql "$DATABASE_URL" -f sql/create_project_graphs.sql
+--
+-- graphs is an array of
+--
+--     {"project":          {...projects columns...},
+--      "phases":           [{...project_phases columns..., "tasks": [{...project_tasks columns...}]}],
+--      "components":       [{...project_components columns...}],
+--      "timeline_entries": [{...project_timeline_entries columns...}]}
+--
+-- Ids may be given (plan graphs carry their own) or left out to be generated
+-- here; project_id / phase_id links are filled in from the nesting. user_id
+-- and created_by default to the caller. A project's seed_run_id, if it has
+-- one, is stamped on the rows of its graph right after the inserts; only
+-- tagged graphs touch that column, so untagged calls also work without
+-- seed-run-tags.sql. Rows whose id already exists are skipped, so a batch
+-- that was sent before can be sent again. Any other error rolls back the
+-- whole call.
+--
+-- Returns one object per graph, in order:
+--
+--     {"project_id": ..., "phase_ids": {"<phase_order>": ...}, "task_ids": [...],
+--      "component_ids": [...], "timeline_entry_ids": [...]}
+--
+-- The ids lists only hold rows inserted by this call. The function runs as the
+-- caller (security invoker), so row level security still applies.
+
+create or replace function public.create_project_graphs(graphs jsonb)
+returns jsonb
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    graph           jsonb;
+    new_project_id  uuid;
+    run_tag         text;
+    phases          jsonb;
+    result          jsonb := '[]'::jsonb;
+    phase_ids       jsonb;
+    task_ids        jsonb;
+    component_ids   jsonb;
+    entry_ids       jsonb;
+begin
+    for graph in select value from jsonb_array_elements(graphs) loop
+        new_project_id := coalesce((graph->'project'->>'id')::uuid, gen_random_uuid());
+        run_tag := graph->'project'->>'seed_run_id';
+
+        insert into projects (id, user_id, cluster_id, project_title, vehicle_make, vehicle_model, vehicle_year,
+                              vision_statement, target_range, target_motor, target_battery_kwh, target_budget,
+                              project_image_url, project_status)
+        select new_project_id, coalesce(p.user_id, auth.uid()), p.cluster_id, p.project_title, p.vehicle_make,
+               p.vehicle_model, p.vehicle_year, p.vision_statement, p.target_range, p.target_motor,
+               p.target_battery_kwh, p.target_budget, p.project_image_url, p.project_status
+        from jsonb_to_record(graph->'project') as p(user_id uuid, cluster_id uuid, project_title text,
+             vehicle_make text, vehicle_model text, vehicle_year text, vision_statement text, target_range integer,
+             target_motor text, target_battery_kwh integer, target_budget text, project_image_url text,
+             project_status text)
+        on conflict (id) do nothing;
+
+        -- settle the phase ids first, so the tasks can point at them
+        select coalesce(jsonb_agg(phase || jsonb_build_object('id', coalesce(phase->>'id', gen_random_uuid()::text))
+                                  order by n), '[]'::jsonb)
+        into phases
+        from jsonb_array_elements(coalesce(graph->'phases', '[]'::jsonb)) with ordinality as e(phase, n);
+
+        with inserted as (
+            insert into project_phases (id, project_id, phase_name, description, phase_order, status,
+                                        started_at, completed_at)
+            select ph.id, new_project_id, ph.phase_name, ph.description, ph.phase_order, ph.status,
+                   ph.started_at, ph.completed_at
+            from jsonb_to_recordset(phases) as ph(id uuid, phase_name text, description text, phase_order integer,
+                 status text, started_at timestamptz, completed_at timestamptz)
+            on conflict (id) do nothing
+            returning id, phase_order
+        )
+        select coalesce(jsonb_object_agg(phase_order, id), '{}'::jsonb) into phase_ids from inserted;
+
+        with inserted as (
+            insert into project_tasks (id, phase_id, task_name, status, priority, estimated_hours, task_order)
+            select coalesce(t.id, gen_random_uuid()), (phase->>'id')::uuid, t.task_name, t.status, t.priority,
+                   t.estimated_hours, t.task_order
+            from jsonb_array_elements(phases) as phase,
+                 jsonb_to_recordset(coalesce(phase->'tasks', '[]'::jsonb)) as t(id uuid, task_name text,
+                 status text, priority text, estimated_hours integer, task_order integer)
+            on conflict (id) do nothing
+            returning id
+        )
+        select coalesce(jsonb_agg(id), '[]'::jsonb) into task_ids from inserted;
+
+        with inserted as (
+            insert into project_components (id, project_id, component_name, category, vendor, expected_delivery,
+                                            estimated_cost, notes, status, model_number)
+            select coalesce(c.id, gen_random_uuid()), new_project_id, c.component_name, c.category, c.vendor,
+                   c.expected_delivery, c.estimated_cost, c.notes, c.status, c.model_number
+            from jsonb_to_recordset(coalesce(graph->'components', '[]'::jsonb)) as c(id uuid, component_name text,
+                 category text, vendor text, expected_delivery timestamptz, estimated_cost integer, notes text,
+                 status text, model_number text)
+            on conflict (id) do nothing
+            returning id
+        )
+        select coalesce(jsonb_agg(id), '[]'::jsonb) into component_ids from inserted;
+
+        with inserted as (
+            insert into project_timeline_entries (id, project_id, entry_type, title, description, photo_url,
+                                                  created_by)
+            select coalesce(te.id, gen_random_uuid()), new_project_id, te.entry_type, te.title, te.description,
+                   te.photo_url, coalesce(te.created_by, auth.uid())
+            from jsonb_to_recordset(coalesce(graph->'timeline_entries', '[]'::jsonb)) as te(id uuid,
+                 entry_type text, title text, description text, photo_url text, created_by uuid)
+            on conflict (id) do nothing
+            returning id
+        )
+        select coalesce(jsonb_agg(id), '[]'::jsonb) into entry_ids from inserted;
+
+        -- plpgsql plans a statement when it first runs it, so these never
+        -- reach a schema without the column unless a graph is tagged
+        if run_tag is not null then
+            update projects set seed_run_id = run_tag where id = new_project_id;
+            update project_phases set seed_run_id = run_tag
+            where id in (select value::uuid from jsonb_each_text(phase_ids));
+            update project_tasks set seed_run_id = run_tag
+            where id in (select value::uuid from jsonb_array_elements_text(task_ids));
+            update project_components set seed_run_id = run_tag
+            where id in (select value::uuid from jsonb_array_elements_text(component_ids));
+            update project_timeline_entries set seed_run_id = run_tag
+            where id in (select value::uuid from jsonb_array_elements_text(entry_ids));
+        end if;
+
+        result := result || jsonb_build_array(jsonb_build_object(
+            'project_id',           new_project_id,
+            'phase_ids',            phase_ids,
+            'task_ids',             task_ids,
+            'component_ids',        component_ids,
+            'timeline_entry_ids',   entry_ids));
+    end loop;
+    return result;
+end;
+$$;
+
+do $$
+begin
+    -- only Supabase has the authenticated role
+    if exists (select from pg_roles where rolname = 'authenticated') then
+        grant execute on function public.create_project_graphs(jsonb) to authenticated;
+    end if;
+end
+$$;
@@ -0,0 +1,93 @@
+-- The tables the seeder writes, with only the columns it fills in, for
+-- trying the direct-connection loaders against a local Postgres:
+--
+--     createdb evseed && psql evseed -f sql/local-schema.sql
+--     DATABASE_URL=postgresql:///evseed python main-create-projects.py --copy --count 1000
+--     psql evseed -f sql/create_project_graphs.sql
+--     psql evseed -f sql/seed-run-tags.sql
+
+create extension if not exists pgcrypto;
+
+-- Supabase provides auth.uid() (the signed-in user); stand in for it locally
+do $$
+begin
+    if to_regprocedure('auth.uid()') is null then
+        create schema if not exists auth;
+        create function auth.uid() returns uuid language sql stable
+            as $uid$ select nullif(current_setting('request.jwt.claim.sub', true), '')::uuid $uid$;
+    end if;
+end
+$$;
+
+create table if not exists projects (
+    id                  uuid primary key default gen_random_uuid(),
+    user_id             uuid,
+    cluster_id          uuid,
+    project_title       text,
+    vehicle_make        text,
+    vehicle_model       text,
+    vehicle_year        text,
+    vision_statement    text,
+    target_range        integer,
+    target_motor        text,
+    target_battery_kwh  integer,
+    target_budget       text,
+    project_image_url   text,
+    project_status      text,
+    created_at          timestamptz not null default now()
+);
+
+create table if not exists project_phases (
+    id                  uuid primary key default gen_random_uuid(),
+    project_id          uuid not null references projects (id),
+    phase_name          text,
+    description         text,
+    phase_order         integer,
+    status              text,
+    started_at          timestamptz,
+    completed_at        timestamptz,
+    created_at          timestamptz not null default now()
+);
+
+create table if not exists project_tasks (
+    id                  uuid primary key default gen_random_uuid(),
+    phase_id            uuid references project_phases (id),
+    task_name           text,
+    status              text,
+    priority            text,
+    estimated_hours     integer,
+    task_order          integer,
+    started_at          timestamptz,
+    completed_at        timestamptz,
+    created_at          timestamptz not null default now()
+);
+
+create table if not exists project_components (
+    id                  uuid primary key default gen_random_uuid(),
+    project_id          uuid not null references projects (id),
+    component_name      text,
+    category            text,
+    vendor              text,
+    expected_delivery   timestamptz,
+    estimated_cost      integer,
+    notes               text,
+    status              text,
+    model_number        text,
+    created_at          timestamptz not null default now()
+);
+
+create table if not exists project_timeline_entries (
+    id                  uuid primary key default gen_random_uuid(),
+    project_id          uuid not null references projects (id),
+    entry_type          text,
+    title               text,
+    description         text,
+    photo_url           text,
+    created_by          uuid,
+    created_at          timestamptz not null default now()
+);
+
+create index if not exists project_phases_project_id on project_phases (project_id);
+create index if not exists project_tasks_phase_id on project_tasks (phase_id);
+create index if not exists project_components_project_id on project_components (project_id);
+create index if not exists project_timeline_entries_project_id on project_timeline_entries (project_id);
@@ -0,0 +1,19 @@
+-- Tag every seeded row with the run that created it, so a run can be torn
+-- down again (python main-create-projects.py teardown --run-id ...).
+-- Run once per project, before seeding with run tags:
+--
+--     psql "$DATABASE_URL" -f sql/seed-run-tags.sql
+--
+-- The partial indexes only cover tagged rows, so real data pays nothing.
+
+alter table projects                 add column if not exists seed_run_id text;
+alter table project_phases           add column if not exists seed_run_id text;
+alter table project_tasks            add column if not exists seed_run_id text;
+alter table project_components       add column if not exists seed_run_id text;
+alter table project_timeline_entries add column if not exists seed_run_id text;
+
+create index if not exists projects_seed_run_id                 on projects (seed_run_id) where seed_run_id is not null;
+create index if not exists project_phases_seed_run_id           on project_phases (seed_run_id) where seed_run_id is not null;
+create index if not exists project_tasks_seed_run_id            on project_tasks (seed_run_id) where seed_run_id is not null;
+create index if not exists project_components_seed_run_id       on project_components (seed_run_id) where seed_run_id is not null;
+create index if not exists project_timeline_entries_seed_run_id on project_timeline_entries (seed_run_id) where seed_run_id is not null;
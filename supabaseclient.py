@@ -1,164 +1,354 @@
 import json
 import os
+import httpx
 import supabase
 from WebsiteTester import SUPABASE_KEY
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import random
-from supabase import create_client
-from wonderwords import RandomSentence
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from supabase import ClientOptions, create_client
+from postgrest import ReturnMethod
 from faker import Faker
 from faker_vehicle import VehicleProvider
+from projectplan import ProjectPlanner, ProjectRecords, PLAN_TABLES, assign_owner, nest_graph, read_plan, read_plan_header
+from runmanifest import COMPLETE, RunManifest
+from authcache import TokenCache
+from metrics import RequestMetrics, describe_request
 
-rs = RandomSentence()
+class SupabaseClient(ProjectRecords):
 
-class SupabaseClient:
-
-    def configure_project_phases(self, project_id) :
-        phases = self.supabase.table("project_phases") \
-            .select("*") \
-            .eq("project_id", f"{project_id}") \
-            .execute()
-        
-        base_date =  datetime.now() + timedelta(days=random.randint(-720, -30))
-        for phase in phases.data:        
-            status = random.choice(["completed", "in_progress", "pending"])
-            record = {            
-                "phase_id":     phase['id'],
-                "status":       status,
-                "created_at":   base_date.isoformat()
-            }
-            if status == "completed":
-                record['completed_at'] = (base_date + timedelta(days=random.randint(5, 365))).isoformat()
-            if status == "in_progress":
-                record['started_at'] = (base_date + timedelta(days=random.randint(1, 365))).isoformat()
-
-            print(f"  - Adding project phase: {phase['phase_name']}")
-            response = self.supabase.table("project_tasks").update(record).eq("id", phase['id']).execute()
-            response.raise_for_status()
-        return base_date
-
-    def add_project_timeline_entries(self, new_project_name, project_id, count = 15):    
-        images = self.data['images']    
-        for _ in range(count):
-            record = {
-                "project_id":   project_id,
-                "entry_type":   random.choice(["progress", "photo", "milestone", "note", "issue", "solution"]),
-                "title":        rs.simple_sentence(),
-                "description":  rs.sentence() + "\n" + rs.sentence(),
-                "photo_url":    random.choice(images),
-                "created_by":   self.SESSION['user_id']
-            }
-            print(f"  - Adding project timeline entry: {record['title']}")
-            self.supabase.table("project_timeline_entries").insert(record).execute()
+    def add_project_timeline_entries(self, new_project_name, project_id, count = 15):
+        return self.insert_rows("project_timeline_entries", self.build_timeline_records(project_id, count))
 
     def add_component(self, project_id, count = 24):
-        components = self.data['components']  
-        vendors = self.data['ev_conversion_vendors']
-        component_types = self.data['component_types']
-
-        for _ in range(count):
-            dt =  datetime.now() + timedelta(days=random.randint(-30, 30))
-            record = {
-                "project_id":           project_id,
-                "component_name":       random.choice(components),
-                "category":             random.choice(component_types),
-                "vendor":               random.choice(vendors),
-                "expected_delivery":    dt.isoformat(),
-                "estimated_cost":       random.randint(100, 5000),
-                "notes":                rs.simple_sentence(),
-                "status":               random.choice(["ordered", "installed", "received", "tested"]),
-                "model_number":         f"MDL-{random.randint(100,999)}",
-            }
-
-            print(f" ~ Adding Component entry: {record['component_name']}")
-            self.supabase.table("project_components").insert(record).execute()
-        
-    def create_project(self, count = 10) -> str:
-        x = json.load(open('car_dataset.json'))
-        e = []
-        for item in x :
-            if 'hosted_url' in item and item['hosted_url']:
-                e.append(item)
-
-        target_motors = self.data['target_motors']
-
-        for _ in range(count):
-            vehicle = random.choice(e)
-            print(f"Creating project for vehicle: {vehicle['year']} {vehicle['make']} {vehicle['model']}")
-            
-            vehicle_make = vehicle['make']
-            vehicle_model = vehicle['model']
-            vehicle_year = vehicle['year']
-            image_url = vehicle['hosted_url']
-            new_project_name = f"{vehicle_year} {vehicle_make} {vehicle_model} ({random.randint(1000,9999)})"
-            record = {
-                "user_id":              self.SESSION['user_id'],
-                "cluster_id":           os.getenv("TODO_CLUSTER_ID"),
-                "project_title":        new_project_name,
-                "vehicle_make":         vehicle_make,
-                "vehicle_model":        vehicle_model,
-                "vehicle_year":         vehicle_year,
-                "vision_statement":     rs.simple_sentence() + " " + rs.simple_sentence() + " " + rs.simple_sentence(),
-                "target_range":         random.randint(5, 100) * 10,
-                "target_motor":         random.choice(target_motors),
-                "target_battery_kwh":   random.randint(20, 200),
-                "target_budget":        "$30K - $50K",
-                "project_image_url":    image_url,
-                "project_status":       random.choice(["Planning", "In Progress", "Completed", "On Hold"])
-            }
-            response = self.supabase.table("projects").insert(record).execute()
-            project_id = response.data[0]['id']
-
-            print(f"Created new project: {new_project_name} (ID: {project_id})")
-            self.configure_project_phases(project_id)
-            self.add_component(project_id)
-            self.add_project_timeline_entries(new_project_name, project_id)
-            self.create_conversion_phases(project_id)
+        return self.insert_rows("project_components", self.build_component_records(project_id, count))
+
+    def insert_rows(self, table, rows, chunk_size = None, returning = ReturnMethod.representation, upsert = False) -> list:
+        """
+        Insert rows into a table as chunked array inserts, one round trip per chunk.
+        Returns the inserted rows as reported by PostgREST (nothing when
+        returning is ReturnMethod.minimal). With upsert=True rows whose id
+        already exists are overwritten instead of failing the chunk.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        inserted = []
+        self.tag(rows)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            if upsert:
+                query = self.supabase.table(table).upsert(chunk, on_conflict="id", returning=returning)
+            else:
+                query = self.supabase.table(table).insert(chunk, returning=returning)
+            response = self._execute(query)
+            inserted.extend(response.data)
+            print(f"  ~ Inserted {len(chunk)} rows into {table} ({start + len(chunk)}/{len(rows)})")
+        return inserted
+
+    def queue_rows(self, table, rows):
+        """
+        Buffer rows for a table and send them once a full chunk has accumulated,
+        so child rows of many projects share the same array inserts.
+        """
+        chunks = []
+        with self._pending_lock:
+            pending = self._pending.setdefault(table, [])
+            pending.extend(rows)
+            while len(pending) >= self.chunk_size:
+                chunks.append(pending[:self.chunk_size])
+                del pending[:self.chunk_size]
+        # send outside the lock so other workers keep queueing meanwhile
+        for chunk in chunks:
+            self.insert_rows(table, chunk)
+
+    def flush(self):
+        """Send every row still waiting in the buffer"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for table, rows in pending.items():
+            if rows:
+                self.insert_rows(table, rows)
+
+    def _execute(self, query):
+        """
+        Run a PostgREST query, holding one of the in-flight request slots, and
+        record it in self.metrics. Requests that are safe to repeat (everything
+        but plain inserts and RPC calls) are retried after connection errors.
+        """
+        self._refresh_token()
+        table, operation, rows, payload_bytes = describe_request(query)
+
+        retries = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                with self._in_flight:
+                    response = query.execute()
+                break
+            except httpx.TransportError:
+                if operation in ("insert", "rpc") or retries >= self.max_retries:
+                    self.metrics.record(table, operation, time.perf_counter() - started, 0, payload_bytes,
+                                        error=True, retries=retries)
+                    raise
+                retries += 1
+                # back off without holding a slot, so other workers keep sending
+                time.sleep(0.5 * 2 ** retries)
+            except Exception:
+                self.metrics.record(table, operation, time.perf_counter() - started, 0, payload_bytes,
+                                    error=True, retries=retries)
+                raise
+        if operation == "select":
+            rows = len(response.data)
+        self.metrics.record(table, operation, time.perf_counter() - started, rows, payload_bytes, retries=retries)
+        return response
+
+    def _refresh_token(self):
+        """Swap in a new access token once the cached one is close to expiring"""
+        session = self.tokens.get()
+        if session['access_token'] != self.SESSION.get('BearerToken'):
+            self.SESSION['BearerToken'] = session['access_token']
+            self.supabase.postgrest.auth(session['access_token'])
+
+    def create_project(self, count = 10, workers = 1, run_id = None, batch_projects = 1) -> str:
+        """
+        Create count projects. With workers > 1 the projects are built in a
+        thread pool sharing this client's HTTP connection pool; a project that
+        fails is reported and skipped without stopping the others.
+
+        When the client was built with use_rpc=True, every batch_projects
+        projects are created by one create_project_graphs call instead of a
+        dozen requests each.
+
+        Giving a run_id makes the run resumable instead (see seed_run), and
+        the number of projects loaded is returned.
+        """
+        if run_id:
+            return self.seed_run(run_id, count=count, workers=workers)
+
+        vehicles = self.open_catalog().hosted
+        project_id = None
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            if self.use_rpc:
+                sizes = [min(batch_projects, count - start) for start in range(0, count, batch_projects)]
+                futures = {pool.submit(self._create_project_batch, vehicles, size): size for size in sizes}
+            else:
+                futures = {pool.submit(self._create_one_project, vehicles): 1 for _ in range(count)}
+            for future in as_completed(futures):
+                try:
+                    project_id = future.result()
+                except Exception as e:
+                    failed += futures[future]
+                    print(f"✗ Project failed: {e}")
+        self.flush()
+
+        print(f"Created {count - failed} of {count} projects ({failed} failed)")
         return project_id
 
+    def _create_one_project(self, vehicles) -> str:
+        vehicle = random.choice(vehicles)
+        print(f"Creating project for vehicle: {vehicle['year']} {vehicle['make']} {vehicle['model']}")
+        record = self.tag([self.build_project_record(vehicle)])[0]
+        response = self._execute(self.supabase.table("projects").insert(record))
+        project_id = response.data[0]['id']
+
+        print(f"Created new project: {record['project_title']} (ID: {project_id})")
+        self.queue_rows("project_components", self.build_component_records(project_id))
+        self.queue_rows("project_timeline_entries", self.build_timeline_records(project_id, vehicle=vehicle))
+        self.create_conversion_phases(project_id)
+        return project_id
+
+    def _create_project_batch(self, vehicles, count) -> str:
+        graphs = [self.build_project_graph(random.choice(vehicles)) for _ in range(count)]
+        created = self.create_project_graphs(graphs)
+        for graph, ids in zip(graphs, created):
+            print(f"Created new project: {graph['project']['project_title']} (ID: {ids['project_id']})")
+        return created[-1]['project_id']
+
+    def create_project_graphs(self, graphs) -> list:
+        """
+        Create nested project graphs (see projectplan.nest_graph and
+        sql/create_project_graphs.sql) server-side with one RPC call. The call
+        is one transaction, so either every row of every graph lands or none.
+        Returns the ids created, one dict per graph: project_id, phase_ids by
+        phase_order, task_ids, component_ids and timeline_entry_ids.
+        """
+        if isinstance(graphs, dict):
+            graphs = [graphs]
+        return self._execute(self.supabase.rpc("create_project_graphs", {"graphs": graphs})).data
+
+    def load_plan(self, plan_path, batch_projects = 100, workers = 1, run_id = None, manifest = None) -> int:
+        """
+        Stream a plan written by projectplan.write_plan into Supabase. Graphs are
+        loaded batch_projects at a time, table by table in dependency order; the
+        rows carry their own ids so nothing needs to be read back.
+
+        With a run_id, progress is checkpointed in the manifest and a rerun
+        with the same run_id only loads what is missing.
+        """
+        stages = {}
+        if run_id:
+            manifest = manifest or RunManifest()
+            header = read_plan_header(plan_path)
+            manifest.start_run(run_id, header['seed'], header['count'],
+                               datetime.fromisoformat(header['reference_date']), source=plan_path)
+            stages = manifest.stages(run_id)
+
+        graphs = (graph for graph in read_plan(plan_path) if stages.get(graph['index'], 0) < COMPLETE)
+        loaded = self._load_batches(graphs, batch_projects, workers, manifest, run_id, stages)
+        if run_id:
+            manifest.finish_run(run_id)
+
+        print(f"Loaded {loaded} projects from {plan_path}")
+        return loaded
+
+    def seed_run(self, run_id, count = 10, seed = None, batch_projects = 100, workers = 1, manifest = None,
+                 start = 0, stop = None) -> int:
+        """
+        Generate and load count projects as a resumable run. The run's seed is
+        kept in the manifest, so a restart regenerates the same graphs, skips
+        the completed projects and upserts the partially written ones.
+
+        start and stop limit this call to a slice of the run's plan indexes,
+        so several processes can share one run (see shardedseed). Only a call
+        covering the whole run marks it finished.
+        """
+        manifest = manifest or RunManifest()
+        planner = ProjectPlanner(seed=seed)
+        run = manifest.start_run(run_id, planner.seed, count, planner.reference_date, source="seed_run")
+        planner.seed = run['seed']
+        planner.reference_date = run['reference_date']
+        stages = manifest.stages(run_id)
+
+        stop = run['count'] if stop is None else min(stop, run['count'])
+        graphs = planner.project_graphs(start, stop, wanted=lambda index: stages.get(index, 0) < COMPLETE)
+        loaded = self._load_batches(graphs, batch_projects, workers, manifest, run_id, stages)
+        if start == 0 and stop == run['count']:
+            manifest.finish_run(run_id)
+
+        print(f"Run {run_id}: loaded {loaded} projects, {manifest.completed(run_id)}/{run['count']} complete")
+        return loaded
+
+    def seed_projects(self, count = 10, seed = None, start = 0, batch_projects = 100, workers = 1) -> int:
+        """
+        Generate plan indexes start..start+count-1 of a seed and load them,
+        like seed_run but without checkpoints. Returns the number loaded.
+        """
+        planner = ProjectPlanner(seed=seed)
+        loaded = self._load_batches(planner.project_graphs(start, start + count), batch_projects, workers, None, None, {})
+        print(f"Loaded {loaded} projects (seed {planner.seed}, indexes {start}-{start + count - 1})")
+        return loaded
+
+    def _load_batches(self, graphs, batch_projects, workers, manifest, run_id, stages) -> int:
+        """
+        Load graphs in batches on a thread pool. Graphs are produced on this
+        thread (the planner is not thread safe) and only a few batches are
+        kept in flight, so memory stays flat for any run size. A failed batch
+        is reported and the rest carry on.
+        """
+        workers = max(1, workers)
+        loaded = 0
+        pending = set()
+
+        def collect(done):
+            count = 0
+            for future in done:
+                try:
+                    count += future.result()
+                except Exception as e:
+                    print(f"✗ Batch failed: {e}")
+            return count
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            batch = []
+            for graph in graphs:
+                batch.append(graph)
+                if len(batch) >= batch_projects:
+                    pending.add(pool.submit(self.load_graphs, batch, manifest, run_id, stages))
+                    batch = []
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    loaded += collect(done)
+            if batch:
+                pending.add(pool.submit(self.load_graphs, batch, manifest, run_id, stages))
+            loaded += collect(wait(pending)[0])
+        return loaded
+
+    def load_graphs(self, graphs, manifest = None, run_id = None, stages = None) -> int:
+        """
+        Insert a batch of project graphs. stages holds the manifest stage of
+        graphs that a previous attempt already started: their finished tables
+        are skipped and the rest are upserted on id, since some of their rows
+        may already be there. With use_rpc the whole batch is one
+        create_project_graphs call instead.
+        """
+        stages = stages or {}
+        assign_owner(graphs, self.SESSION['user_id'], self.SESSION.get('cluster_id') or os.getenv("TODO_CLUSTER_ID"),
+                     self.run_tag)
+
+        indexes = [graph['index'] for graph in graphs]
+        if manifest:
+            manifest.begin(run_id, [(graph['index'], graph['projects'][0]['id']) for graph in graphs])
+
+        if self.use_rpc:
+            # one transaction for the whole batch; rows a partial attempt left are skipped server-side
+            self.create_project_graphs([nest_graph(graph) for graph in graphs])
+            if manifest:
+                manifest.mark(run_id, indexes, COMPLETE)
+            return len(graphs)
+
+        for stage, table in enumerate(PLAN_TABLES):
+            fresh = [row for graph in graphs if graph['index'] not in stages for row in graph[table]]
+            resumed = [row for graph in graphs if stages.get(graph['index'], COMPLETE) <= stage for row in graph[table]]
+            self.insert_rows(table, fresh, returning=ReturnMethod.minimal)
+            self.insert_rows(table, resumed, returning=ReturnMethod.minimal, upsert=True)
+            if manifest:
+                manifest.mark(run_id, indexes, stage + 1)
+        return len(graphs)
+
     def create_conversion_phases(self, project_id):
-        phases = self.data['project_phases']        
-        i:int = 0
-        for phase in phases:
-            i += 1 
-            record = {
-                "phase_name":   phase['title'],
-                "description":  phase['description'],
-                "project_id":   project_id,
-                "phase_order":  i,
-                "status":       random.choice(["pending", "in_progress", "completed"])
-            }
-            print(f"  - Adding conversion phase: {phase['title']}")
-            r = self.supabase.table("project_phases").insert(record).execute()
-
-            for each_task in phase['subtasks']:
-                task_record = {
-                    "task_name":        each_task,
-                    "phase_id":         r.data[0]['id'],
-                    "status":           random.choice(["pending", "completed"]),
-                    "priority":         random.choice(["low", "medium", "high"]),
-                    "estimated_hours":  random.randint(1, 20),
-                    "task_order":       phase['subtasks'].index(each_task) + 1
-                }
-                print(f"    - Adding conversion task: {each_task}")
-                self.supabase.table("project_tasks").insert(task_record).execute()
-        pass
-
-
-    def __init__(self, config:dict ):    
+        # one round trip for all phases, ids come back in the representation
+        phase_records = self.build_phase_records(project_id)
+        inserted = self.insert_rows("project_phases", phase_records, chunk_size=len(phase_records))
+        phase_ids = {row['phase_order']: row['id'] for row in inserted}
+
+        # ...and one more for every task of every phase
+        task_records = self.build_task_records(phase_ids)
+        self.insert_rows("project_tasks", task_records, chunk_size=len(task_records))
+        return phase_ids
+
+
+    def __init__(self, config:dict, chunk_size:int = 500, verbose:bool = False, max_in_flight:int = 8,
+                 max_retries:int = 2, metrics:RequestMetrics = None, use_rpc:bool = False, run_tag:str = None):    
         from dotenv import load_dotenv
         load_dotenv()   
         self.supabase_url = os.getenv("SUPABASE_URL") 
         self.supabase_key = os.getenv("SUPABASE_KEY")
-        self.supabase = create_client(self.supabase_url, self.supabase_key)
         
         self.data = json.load(open('lists.json'))
+        self.chunk_size = chunk_size    # rows per array insert
+        self.verbose = verbose          # print every generated row
+        self._pending = {}              # table -> rows waiting for a full chunk
+        self._pending_lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)    # caps concurrent requests across workers
+        self.max_retries = max_retries  # retries of idempotent requests after connection errors
+        self.metrics = metrics or RequestMetrics()
+        self.use_rpc = use_rpc          # create whole graphs with the create_project_graphs function
+        self.run_tag = run_tag          # seed_run_id of every row written
 
-        response = self.supabase.auth.sign_in_with_password({        
-            "email":   os.getenv("ELCTROMOTIVE_USER"),
-            "password": os.getenv("ELCTROMOTIVE_PASSWORD")
-        })
+        # reuse the token WebsiteTester (or an earlier run) cached; signs in only if there is none
         self.SESSION = config
-        self.SESSION['user_id'] = response.user.id
-        self.SESSION['BearerToken'] = response.session.access_token
\ No newline at end of file
+        self.tokens = TokenCache(self.supabase_url, self.supabase_key,
+                                 email=config.get('username'), password=config.get('password'),
+                                 path=config.get('token_file', 'auth-tokens.json'), metrics=self.metrics)
+        session = self.tokens.get()
+        self.SESSION['user_id'] = session['user_id']
+        self.SESSION['BearerToken'] = session['access_token']
+        self.supabase = create_client(self.supabase_url, self.supabase_key,
+                                      ClientOptions(headers={"Authorization": f"Bearer {session['access_token']}"}))
+
+        # build the PostgREST client (and its httpx connection pool) now, so
+        # worker threads share one instead of racing to create their own
+        self.supabase.postgrest
\ No newline at end of file
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+"""
+Local stand-in for the parts of Supabase the seeder talks to.
+
+An in-memory PostgREST subset on /rest/v1/<table>:
+
+    POST    insert (one row or an array), Prefer return=representation|minimal,
+            resolution=merge-duplicates for upserts; missing ids are generated
+    GET     select with eq / neq / in / is filters, order and limit
+    PATCH   update the rows matching the filters
+    DELETE  delete the rows matching the filters
+
+the create_project_graphs function on /rest/v1/rpc/ (see sql/create_project_graphs.sql),
+and GoTrue's /auth/v1/token with the password and refresh_token grants. Every
+request waits `latency_ms` (± `jitter_ms`) plus `row_latency_ms` per row
+written, and `error_rate` of them are answered with 503, so the client's
+batching, concurrency and retries can be measured without a live project.
+
+    python supabasestub.py --port 8901 --latency-ms 20 --jitter-ms 5 --row-latency-ms 0.05
+    SUPABASE_URL=http://127.0.0.1:8901 python main-create-projects.py --count 10
+"""
+
+# query parameters that are not column filters
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+
+class Table:
+    """Rows by id, with hash indexes on the columns that have been filtered on"""
+
+    def __init__(self):
+        self.rows = {}
+        self.indexes = {}       # column -> value -> set of ids
+        self.sequence = {}      # id -> insertion number, to return rows in insertion order
+        self._next = 0
+
+    def insert(self, row, upsert = False) -> bool:
+        """False when the id is taken and this is not an upsert"""
+        if row['id'] in self.rows:
+            if not upsert:
+                return False
+            self.delete(row['id'])
+        self.rows[row['id']] = row
+        self.sequence[row['id']] = self._next
+        self._next += 1
+        for column, index in self.indexes.items():
+            index.setdefault(_key(row.get(column)), set()).add(row['id'])
+        return True
+
+    def delete(self, row_id):
+        row = self.rows.pop(row_id)
+        del self.sequence[row_id]
+        for column, index in self.indexes.items():
+            index.get(_key(row.get(column)), set()).discard(row_id)
+
+    def ids_where(self, column, value) -> set:
+        index = self.indexes.get(column)
+        if index is None:
+            index = self.indexes[column] = {}
+            for row_id, row in self.rows.items():
+                index.setdefault(_key(row.get(column)), set()).add(row_id)
+        return index.get(value, set())
+
+    def select(self, filters) -> list:
+        """Rows matching every (column, operator, value) filter, in insertion order"""
+        candidates = None
+        for column, operator, value in filters:
+            if operator == 'eq':
+                ids = self.ids_where(column, value)
+            elif operator == 'in':
+                ids = set().union(*(self.ids_where(column, each) for each in value))
+            else:
+                continue
+            candidates = ids if candidates is None else candidates & ids
+        if candidates is None:
+            rows = list(self.rows.values())
+        else:
+            rows = [self.rows[row_id] for row_id in sorted(candidates, key=self.sequence.get)]
+        return [row for row in rows if all(_matches(row, *f) for f in filters if f[1] not in ('eq', 'in'))]
+
+
+def _key(value):
+    """Filter values arrive as text, so index by the text form"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _matches(row, column, operator, value) -> bool:
+    actual = _key(row.get(column))
+    if operator == 'neq':
+        return actual != value
+    if operator == 'is':
+        return actual == value
+    return True
+
+
+def parse_filters(params) -> list:
+    """PostgREST query parameters -> [(column, operator, value)]; in-lists become tuples"""
+    filters = []
+    for column, expression in params:
+        if column in RESERVED_PARAMS:
+            continue
+        operator, _, value = expression.partition('.')
+        if operator == 'in':
+            value = tuple(item.strip().strip('"') for item in value.strip('()').split(',') if item.strip())
+        elif operator == 'is':
+            value = {'null': None, 'true': 'true', 'false': 'false'}.get(value, value)
+        filters.append((column, operator, value))
+    return filters
+
+
+class SupabaseStub:
+    """The in-memory database and accounts behind the handler"""
+
+    def __init__(self, latency_ms = 0, jitter_ms = 0, row_latency_ms = 0, error_rate = 0,
+                 accounts = None, expires_in = 3600):
+        """
+        Args:
+            latency_ms, jitter_ms: added to every request
+            row_latency_ms: added per row written, so batch sizes have a cost
+            error_rate: fraction of requests answered with 503
+            accounts: email -> password; any credentials sign in if not given
+            expires_in: lifetime of issued access tokens, in seconds
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.row_latency_ms = row_latency_ms
+        self.error_rate = error_rate
+        self.accounts = accounts
+        self.expires_in = expires_in
+        self.tables = {}
+        self.refresh_tokens = {}    # refresh token -> email
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def table(self, name) -> Table:
+        if name not in self.tables:
+            self.tables[name] = Table()
+        return self.tables[name]
+
+    def counts(self) -> dict:
+        with self._lock:
+            return {name: len(table.rows) for name, table in self.tables.items()}
+
+    def reset(self):
+        with self._lock:
+            self.tables = {}
+
+    def delay(self, rows = 0):
+        with self._lock:
+            self.requests += 1
+        seconds = (self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms) + rows * self.row_latency_ms) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+        return random.random() >= self.error_rate
+
+    def grant(self, grant_type, body):
+        """Returns (status, GoTrue token response or error)"""
+        if grant_type == 'password':
+            email = body.get('email')
+            if self.accounts is not None and self.accounts.get(email) != body.get('password'):
+                return 400, {"error": "invalid_grant", "error_description": "Invalid login credentials"}
+        elif grant_type == 'refresh_token':
+            with self._lock:
+                email = self.refresh_tokens.pop(body.get('refresh_token'), None)
+            if email is None:
+                return 400, {"error": "invalid_grant", "error_description": "Invalid Refresh Token"}
+        else:
+            return 400, {"error": "unsupported_grant_type"}
+
+        refresh_token = uuid.uuid4().hex
+        with self._lock:
+            self.refresh_tokens[refresh_token] = email
+        return 200, {
+            "access_token":  f"stub.{uuid.uuid4().hex}",
+            "token_type":    "bearer",
+            "expires_in":    self.expires_in,
+            "expires_at":    int(time.time()) + self.expires_in,
+            "refresh_token": refresh_token,
+            "user":          {"id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"stub:{email}")), "email": email},
+        }
+
+    def insert(self, name, rows, upsert = False):
+        """Returns (status, inserted rows or error)"""
+        now = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+        rows = [{"created_at": now, **row, "id": row.get('id') or str(uuid.uuid4())} for row in rows]
+        with self._lock:
+            table = self.table(name)
+            if not upsert:
+                # an array insert is one statement: all rows or none
+                taken = next((row['id'] for row in rows if row['id'] in table.rows), None)
+                if taken:
+                    return 409, {"code": "23505", "message": f'duplicate key value violates unique constraint "{name}_pkey"',
+                                 "details": f"Key (id)=({taken}) already exists.", "hint": None}
+            for row in rows:
+                table.insert(row, upsert=True)
+        return 201, rows
+
+    def create_project_graphs(self, graphs) -> list:
+        """Same contract as sql/create_project_graphs.sql, all graphs under one lock"""
+        now = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+
+        def add(name, row, **links):
+            row = {"created_at": now, **{k: v for k, v in row.items() if not isinstance(v, list)}, **links, **tag}
+            row['id'] = row.get('id') or str(uuid.uuid4())
+            return row['id'] if self.table(name).insert(row) else None
+
+        results = []
+        with self._lock:
+            for graph in graphs:
+                project_id = graph['project'].get('id') or str(uuid.uuid4())
+                tag = {"seed_run_id": graph['project']['seed_run_id']} if graph['project'].get('seed_run_id') else {}
+                add("projects", graph['project'], id=project_id)
+                phase_ids, task_ids = {}, []
+                for phase in graph.get('phases', []):
+                    phase_id = phase.get('id') or str(uuid.uuid4())
+                    if add("project_phases", phase, id=phase_id, project_id=project_id):
+                        phase_ids[str(phase.get('phase_order'))] = phase_id
+                    task_ids += [add("project_tasks", task, phase_id=phase_id) for task in phase.get('tasks', [])]
+                results.append({
+                    "project_id":         project_id,
+                    "phase_ids":          phase_ids,
+                    "task_ids":           [i for i in task_ids if i],
+                    "component_ids":      [i for i in (add("project_components", row, project_id=project_id)
+                                                       for row in graph.get('components', [])) if i],
+                    "timeline_entry_ids": [i for i in (add("project_timeline_entries", row, project_id=project_id)
+                                                       for row in graph.get('timeline_entries', [])) if i],
+                })
+        return results
+
+    def select(self, name, filters, order = None, limit = None, offset = 0) -> list:
+        with self._lock:
+            rows = self.table(name).select(filters)
+        for term in reversed(order.split(',') if order else []):
+            column, _, direction = term.partition('.')
+            rows.sort(key=lambda row: (row.get(column) is None, _key(row.get(column)) or ''),
+                      reverse=direction.startswith('desc'))
+        return rows[offset:offset + limit if limit is not None else None]
+
+    def update(self, name, filters, values) -> list:
+        with self._lock:
+            table = self.table(name)
+            updated = []
+            for row in table.select(filters):
+                table.delete(row['id'])
+                row = dict(row, **values)
+                table.insert(row)
+                updated.append(row)
+        return updated
+
+    def delete(self, name, filters) -> list:
+        with self._lock:
+            table = self.table(name)
+            deleted = table.select(filters)
+            for row in deleted:
+                table.delete(row['id'])
+        return deleted
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'     # keep-alive, like the real thing
+    disable_nagle_algorithm = True    # headers and body go out in separate writes
+
+    def __init__(self, *args, stub = None, **kwargs):
+        self.stub = stub
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.rest('GET')
+
+    def do_HEAD(self):
+        self.rest('GET')
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip('/') == '/auth/v1/token':
+            self.auth()
+        else:
+            self.rest('POST')
+
+    def do_PATCH(self):
+        self.rest('PATCH')
+
+    def do_DELETE(self):
+        self.rest('DELETE')
+
+    def auth(self):
+        body = self.read_json()
+        if not self.stub.delay():
+            return self.reply(503, {"message": "stub error"})
+        grant_type = dict(parse_qsl(urlparse(self.path).query)).get('grant_type')
+        self.reply(*self.stub.grant(grant_type, body or {}))
+
+    def rest(self, method):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts == ['rest', 'v1', 'rpc', 'create_project_graphs'] and method == 'POST':
+            return self.rpc()
+        if len(parts) != 3 or parts[:2] != ['rest', 'v1']:
+            return self.reply(404, {"message": f"no route for {url.path}"})
+        table = parts[2]
+        params = parse_qsl(url.query, keep_blank_values=True)
+        query = dict(params)
+        filters = parse_filters(params)
+        prefer = self.headers.get('Prefer', '')
+        # always drain the body, or the next request on this keep-alive connection starts mid-stream
+        body = self.read_json()
+        body = body if method in ('POST', 'PATCH') else None
+        written = len(body) if isinstance(body, list) else int(body is not None)
+
+        if not self.stub.delay(written):
+            return self.reply(503, {"message": "stub error"})
+        if method == 'POST':
+            status, rows = self.stub.insert(table, body if isinstance(body, list) else [body],
+                                            upsert='merge-duplicates' in prefer)
+        elif method == 'GET':
+            status, rows = 200, self.stub.select(table, filters, query.get('order'),
+                                                 int(query['limit']) if 'limit' in query else None,
+                                                 int(query.get('offset', 0)))
+        elif method == 'PATCH':
+            status, rows = 200, self.stub.update(table, filters, body or {})
+        else:
+            status, rows = 200, self.stub.delete(table, filters)
+
+        headers = {}
+        if 'count=' in prefer and status < 300:
+            headers['Content-Range'] = f"0-{max(len(rows) - 1, 0)}/{len(rows)}" if rows else "*/0"
+        if status >= 300 or method == 'GET' or 'return=representation' in prefer:
+            rows = _project(rows, query.get('select')) if status < 300 else rows
+            self.reply(status, rows, headers)
+        else:
+            self.reply(204 if method != 'POST' else 201, None, headers)
+
+    def rpc(self):
+        graphs = (self.read_json() or {}).get('graphs', [])
+        if not self.stub.delay(sum(1 + len(graph.get('components', [])) + len(graph.get('timeline_entries', []))
+                                   + sum(1 + len(phase.get('tasks', [])) for phase in graph.get('phases', []))
+                                   for graph in graphs)):
+            return self.reply(503, {"message": "stub error"})
+        self.reply(200, self.stub.create_project_graphs(graphs))
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def reply(self, status, payload, headers = None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _project(rows, select):
+    """Apply a plain column list select; embedded resources are not supported"""
+    if not select or select == '*' or '(' in select:
+        return rows
+    columns = [column.strip() for column in select.split(',')]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+def start_stub(port = 0, bind = '127.0.0.1', **options):
+    """
+    Serve a SupabaseStub on a background thread.
+    Returns: (stub, server, base url); stop it with server.shutdown()
+    """
+    stub = SupabaseStub(**options)
+    server = ThreadingHTTPServer((bind, port), partial(StubHandler, stub=stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="supabase-stub", daemon=True).start()
+    return stub, server, f"http://{bind}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Supabase REST and auth APIs")
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--latency-ms', type=float, default=0, help="added to every request")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="latency varies by up to this much either way")
+    parser.add_argument('--row-latency-ms', type=float, default=0, help="added per row written")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    stub, server, url = start_stub(args.port, args.bind, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                   row_latency_ms=args.row_latency_ms, error_rate=args.error_rate)
+    print(f"Supabase stub on {url} ({args.latency_ms}±{args.jitter_ms} ms + {args.row_latency_ms} ms/row, "
+          f"{100 * args.error_rate:.1f}% errors); set SUPABASE_URL={url}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"  {stub.requests} requests, rows: {stub.counts()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from postgrest import CountMethod, ReturnMethod
+from projectplan import PLAN_TABLES
+
+"""
+Teardown of seeded data by run id.
+
+Runs seeded with --tag-run stamp their rows with a seed_run_id (see sql/seed-run-tags.sql).
+Tearing a run down deletes its rows child tables first, so no foreign key is
+ever violated whatever the schema's ON DELETE rules:
+
+    project_timeline_entries, project_components, project_tasks, project_phases, projects
+
+Over the REST API ids are read a page at a time and deleted with batched
+id=in.(...) filters, several batches in parallel. With a direct Postgres
+connection each table is emptied with DELETE ... LIMIT-style batches instead,
+which is an order of magnitude faster for very large runs.
+
+    python main-create-projects.py teardown --run-id 20250101-120000-abc123
+"""
+
+# children before parents
+TEARDOWN_ORDER = list(reversed(PLAN_TABLES))
+
+
+def teardown_run(S, run_id, batch_size = 250, workers = 4) -> dict:
+    """
+    Delete every row tagged with run_id through the REST API of SupabaseClient S.
+
+    Args:
+        batch_size: ids per DELETE; the in-list travels in the URL, so keep it
+            well under the proxy's URL length limit (~250 uuids is 10 KB)
+        workers: DELETE requests in flight at once
+    Returns: table -> rows deleted
+    Raises RuntimeError when a page of rows the API lists cannot be deleted
+    (row level security letting this account read but not delete them).
+    """
+    deleted = {}
+    started = time.perf_counter()
+    print(f"Tearing down run {run_id}...")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for table in TEARDOWN_ORDER:
+            def delete(ids):
+                # count the rows really deleted, RLS silently skips the ones we may not touch
+                return S._execute(S.supabase.table(table).delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
+                                  .in_("id", ids)).count or 0
+
+            deleted[table] = 0
+            table_started = time.perf_counter()
+            while True:
+                page = S._execute(S.supabase.table(table).select("id").eq("seed_run_id", run_id)
+                                  .limit(batch_size * max(1, workers))).data
+                if not page:
+                    break
+                ids = [row['id'] for row in page]
+                count = sum(pool.map(delete, [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]))
+                if not count:
+                    # the same page would come back forever
+                    _print_summary(run_id, deleted, time.perf_counter() - started)
+                    raise RuntimeError(f"{len(ids)} {table} rows of run {run_id} are visible but none could be "
+                                       f"deleted; check the table's delete policy or use --direct")
+                deleted[table] += count
+                elapsed = time.perf_counter() - table_started
+                print(f"  ~ {table}: deleted {deleted[table]} rows ({deleted[table] / max(elapsed, 1e-9):.0f} rows/s)")
+
+    _print_summary(run_id, deleted, time.perf_counter() - started)
+    return deleted
+
+
+def teardown_run_direct(run_id, database_url = None, batch_size = 50000) -> dict:
+    """
+    Delete every row tagged with run_id over a direct Postgres connection, one
+    committed batch at a time so no single statement holds locks for long.
+    Returns: table -> rows deleted
+    """
+    from copyloader import connect
+    from psycopg import sql
+
+    deleted = {}
+    started = time.perf_counter()
+    print(f"Tearing down run {run_id} over a direct connection...")
+    with connect(database_url) as conn:
+        for table in TEARDOWN_ORDER:
+            statement = sql.SQL("DELETE FROM {table} WHERE id IN "
+                                "(SELECT id FROM {table} WHERE seed_run_id = %s LIMIT %s)").format(table=sql.Identifier(table))
+            deleted[table] = 0
+            table_started = time.perf_counter()
+            while True:
+                with conn.transaction(), conn.cursor() as cursor:
+                    cursor.execute(statement, (run_id, batch_size))
+                    count = cursor.rowcount
+                if not count:
+                    break
+                deleted[table] += count
+                elapsed = time.perf_counter() - table_started
+                print(f"  ~ {table}: deleted {deleted[table]} rows ({deleted[table] / max(elapsed, 1e-9):.0f} rows/s)")
+
+    _print_summary(run_id, deleted, time.perf_counter() - started)
+    return deleted
+
+
+def _print_summary(run_id, deleted, elapsed):
+    total = sum(deleted.values())
+    print("\n" + "="*60)
+    print(f"TEARDOWN OF RUN {run_id} COMPLETE")
+    print("="*60)
+    for table in TEARDOWN_ORDER:
+        print(f"  {table:<26} {deleted.get(table, 0):>10}")
+    print(f"Deleted {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
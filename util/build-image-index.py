@@ -1,6 +1,12 @@
 import os
+import io
+import sys
 import json
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from uploadjournal import entry_folder, entry_key, image_path
 
 def parse_folder_name(folder_name):
     """
@@ -21,58 +27,111 @@ def parse_folder_name(folder_name):
     
     return make, model, year
 
-def build_car_dataset(root_folder, output_json='car_dataset.json'):
+# Image file extensions to look for
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp'}
+
+def scan_folder(folder_path):
+    """
+    List the images of one car folder.
+    
+    Returns: list of new dataset entries (make, model, year, file_path and
+    the folder name they came from), sorted by file name
+    """
+    folder = os.path.basename(folder_path)
+    make, model, year = parse_folder_name(folder)
+    entries = []
+    with os.scandir(folder_path) as it:
+        for item in it:
+            if item.is_file() and os.path.splitext(item.name)[1].lower() in IMAGE_EXTENSIONS:
+                entries.append({
+                    'make': make,
+                    'model': model,
+                    'year': year,
+                    'file_path': item.name,
+                    'folder': folder
+                })
+    entries.sort(key=lambda entry: entry['file_path'])
+    return entries
+
+def load_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def write_dataset(dataset, output_json):
+    """
+    Stream the dataset out one entry per line, then swap it into place, so a
+    crash never leaves a half-written file behind.
+    """
+    tmp = output_json + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for i, entry in enumerate(dataset):
+            f.write('  ' + json.dumps(entry, ensure_ascii=False) + (',\n' if i + 1 < len(dataset) else '\n'))
+        f.write(']\n')
+    os.replace(tmp, output_json)
+
+def build_car_dataset(root_folder, output_json='car_dataset.json', workers=8, full=False):
     """
     Enumerate through folders and build a JSON dataset of car images.
     
+    Indexing is incremental: the mtime of every car folder is kept in
+    <output_json>.folders.json and only folders whose mtime changed are
+    rescanned, in parallel. Entries already in output_json keep all their
+    fields (hosted_url, upload status...) as long as their image still exists.
+    
     Args:
         root_folder: Path to the root directory containing car folders
         output_json: Output JSON file name
+        workers: Number of folders scanned in parallel
+        full: Rescan every folder, ignoring the recorded mtimes
     """
-    # Image file extensions to look for
-    image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp'}
+    state_json = output_json + '.folders.json'
+    previous_mtimes = {} if full else load_json(state_json, {})
+    existing = load_json(output_json, [])
+    existing_by_key = {entry_key(entry): entry for entry in existing}
     
-    dataset = []
+    # Group the current dataset by folder, so untouched folders are copied as-is
+    by_folder = {}
+    for entry in existing:
+        by_folder.setdefault(entry_folder(entry), []).append(entry)
     
-    # Walk through the directory structure
-    for root, dirs, files in os.walk(root_folder):
-        # Skip the root folder itself
-        if root == root_folder:
-            continue
-        
-        # Get the folder name (last part of the path)
-        folder_name = os.path.basename(root)
-        
-        try:
-            # Parse the folder name to extract make, model, year
-            make, model, year = parse_folder_name(folder_name)
-            
-            # Process each file in the folder
-            i:int = 0
-            for file in files:
-                file_ext = os.path.splitext(file)[1].lower()
-                i += 1
-                # Check if it's an image file
-                if file_ext in image_extensions:
-                    full_path = os.path.join(root, file)
-                    
-                    # Add entry to dataset
-                    dataset.append({
-                        'make': make,
-                        'model': model,
-                        'year': year,
-                        'file_path': file
-                    })
-                # if i >= 5:
-                #     break
-            
-        except Exception as e:
-            print(f"Error processing folder '{folder_name}': {e}")
-            continue
+    with os.scandir(root_folder) as it:
+        folders = {item.name: item.stat().st_mtime_ns for item in it if item.is_dir()}
+    changed = [name for name, mtime in folders.items() if previous_mtimes.get(name) != mtime]
+    print(f"Folders: {len(folders)} total, {len(changed)} new or changed")
+    
+    def rescan(name):
+        # keep whatever we already know about images that are still there
+        entries = []
+        for entry in scan_folder(os.path.join(root_folder, name)):
+            known = existing_by_key.get(entry_key(entry))
+            if known:
+                known['folder'] = name
+            entries.append(known or entry)
+        return entries
+    
+    mtimes = {name: mtime for name, mtime in folders.items() if name not in changed}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(rescan, name): name for name in changed}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                by_folder[name] = future.result()
+                mtimes[name] = folders[name]
+            except Exception as e:
+                print(f"Error processing folder '{name}': {e}")
     
-    # Write to JSON file
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(dataset, f, indent=2, ensure_ascii=False)
+    # Folders that vanished from disk only keep images that were already hosted
+    for name in set(by_folder) - set(folders):
+        by_folder[name] = [entry for entry in by_folder[name] if entry.get('hosted_url')]
+    
+    dataset = [entry for name in sorted(by_folder) for entry in by_folder[name]]
+    write_dataset(dataset, output_json)
+    with open(state_json, 'w', encoding='utf-8') as f:
+        json.dump(mtimes, f, ensure_ascii=False)
     
     print(f"Dataset created successfully!")
     print(f"Total images: {len(dataset)}")
@@ -84,13 +143,123 @@ def build_car_dataset(root_folder, output_json='car_dataset.json'):
     
     return dataset
 
+def fingerprint_image(path):
+    """
+    Compute the fingerprint of one image. Runs in a worker process.
+    
+    Returns: dict with file_size, content_hash (sha256), phash (64-bit
+    difference hash, hex), width and height
+    """
+    from PIL import Image
+    
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        # dHash: shrink to 9x8 greyscale and compare each pixel to its right neighbour
+        pixels = list(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    
+    return {
+        'file_size': len(data),
+        'content_hash': hashlib.sha256(data).hexdigest(),
+        'phash': f"{bits:016x}",
+        'width': width,
+        'height': height
+    }
+
+def fingerprint_dataset(root_folder, dataset, workers=None, near_distance=6):
+    """
+    Fingerprint every image in a process pool, then flag duplicates so the
+    uploader skips them. Images that already have a fingerprint and whose
+    size did not change are not read again.
+    
+    Duplicates get 'duplicate_of' (the file they repeat) and 'duplicate'
+    ('exact' for identical bytes, 'near' for perceptual hashes at most
+    near_distance bits apart). Hosted images are always kept over unhosted ones.
+    
+    Args:
+        root_folder: Path to the root directory containing car folders
+        dataset: Entries from build_car_dataset, updated in place
+        workers: Number of worker processes (default: one per CPU)
+        near_distance: Maximum phash Hamming distance for a near duplicate
+    """
+    todo = []
+    for entry in dataset:
+        path = image_path(root_folder, entry)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        if not entry.get('content_hash') or entry.get('file_size') != size:
+            todo.append((entry, path))
+    print(f"Fingerprinting {len(todo)} of {len(dataset)} images...")
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fingerprint_image, path): entry for entry, path in todo}
+        for i, future in enumerate(as_completed(futures), start=1):
+            entry = futures[future]
+            try:
+                entry.update(future.result())
+            except Exception as e:
+                print(f"Error fingerprinting '{entry['file_path']}': {e}")
+            if i % 500 == 0:
+                print(f"  {i}/{len(todo)} fingerprinted")
+    
+    # keep hosted images first, so a duplicate is never the copy already uploaded
+    candidates = [entry for entry in dataset if entry.get('content_hash')]
+    candidates.sort(key=lambda entry: not entry.get('hosted_url'))
+    for entry in candidates:
+        entry.pop('duplicate_of', None)
+        entry.pop('duplicate', None)
+    
+    def name(entry):
+        return f"{entry_folder(entry)}/{entry['file_path']}"
+    
+    originals = []
+    seen_hashes = {}
+    for entry in candidates:
+        original = seen_hashes.setdefault(entry['content_hash'], entry)
+        if original is not entry:
+            entry['duplicate_of'] = name(original)
+            entry['duplicate'] = 'exact'
+        else:
+            originals.append(entry)
+    
+    # near duplicates: compare each phash against all the earlier originals at once
+    phashes = np.array([int(entry['phash'], 16) for entry in originals], dtype=np.uint64)
+    kept = np.zeros(len(originals), dtype=bool)
+    for i, entry in enumerate(originals):
+        close = np.flatnonzero(kept[:i] & (np.bitwise_count(phashes[:i] ^ phashes[i]) <= near_distance))
+        if len(close):
+            entry['duplicate_of'] = name(originals[close[0]])
+            entry['duplicate'] = 'near'
+        else:
+            kept[i] = True
+    
+    exact = sum(1 for entry in dataset if entry.get('duplicate') == 'exact')
+    near = sum(1 for entry in dataset if entry.get('duplicate') == 'near')
+    print(f"Duplicates: {exact} exact, {near} near (distance <= {near_distance})")
+    return dataset
+
 if __name__ == "__main__":    
     root_folder = os.path.dirname(os.path.abspath(__file__))
     if not os.path.exists(root_folder):
         print(f"Root folder '{root_folder}' does not exist. Please check the path.")
         exit(1)
 
-    dataset = build_car_dataset(os.path.join(root_folder, "../vehicle-images/"), "../2car_dataset.json")
+    full = '--full' in sys.argv
+    images_folder = os.path.join(root_folder, "../vehicle-images/")
+    dataset = build_car_dataset(images_folder, "../2car_dataset.json", full=full)
+    
+    # Optional: fingerprint images and flag duplicates (needs Pillow)
+    if '--fingerprint' in sys.argv:
+        fingerprint_dataset(images_folder, dataset)
+        write_dataset(dataset, "../2car_dataset.json")
     
     # Optional: Print first few entries as preview
     print("\nSAMPLE First 3 entries")
@@ -0,0 +1,261 @@
+import hashlib
+import os
+import requests
+import shutil
+import sys
+import threading
+from abc import ABC, abstractmethod
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+Image-host backends for the uploader.
+
+Every backend takes a local image file and returns the same result dict
+upload_to_freeimage() always has ('success', 'url', 'display_url', ... or
+'error'), so whatever it hands back ends up as the entry's hosted_url.
+
+    FreeimageHost   freeimage.host, rate limited
+    LocalImageHost  content-addressed directory served over plain HTTP,
+                    for seeding and benchmarking at disk speed:
+
+    python imagehosts.py serve [root] [port]
+"""
+
+def upload_to_freeimage(image_path, api_key, session=None):
+    """
+    Upload an image to Freeimage.host
+    
+    Args:
+        image_path: Full path to the image file
+        api_key: Your Freeimage.host API key
+        session: Optional requests.Session to reuse connections
+    
+    Returns:
+        dict: Response data including image URL
+    """
+    url = "https://freeimage.host/api/1/upload"
+    
+    try:
+        # Open the image file
+        with open(image_path, 'rb') as image_file:
+            # Prepare the request
+            files = {
+                'source': image_file
+            }
+            
+            data = {
+                'key': api_key,
+                'action': 'upload',
+                'format': 'json',
+                'type': 'file',
+                'nsfw': '0'
+            }
+            
+            # Make the POST request
+            response = (session or requests).post(url, files=files, data=data)
+            
+            # Check if request was successful
+            if response.status_code == 200:
+                result = response.json()
+                
+                if result.get('status_code') == 200:
+                    return {
+                        'success': True,
+                        'url': result['image']['url'],
+                        'display_url': result['image']['display_url'],
+                        'delete_url': result['image'].get('delete_url'),
+                        'thumb_url': result['image'].get('thumb', {}).get('url'),
+                        'image_id': result['image'].get('id'),
+                        'raw_response': result
+                    }
+                else:
+                    return {
+                        'success': False,
+                        'error': result.get('error', {}).get('message', 'Unknown error'),
+                        'error_code': result.get('error', {}).get('code'),
+                        'raw_response': result
+                    }
+            else:
+                return {
+                    'success': False,
+                    'error': f'HTTP {response.status_code}: {response.text}',
+                    'status_code': response.status_code
+                }
+    
+    except FileNotFoundError:
+        return {
+            'success': False,
+            'error': f'File not found: {image_path}'
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def verify_image_access(url, timeout=10, session=None):
+    """
+    Verify that an uploaded image is accessible
+    
+    Args:
+        url: Image URL to check
+        timeout: Request timeout in seconds
+        session: Optional requests.Session to reuse connections
+    
+    Returns:
+        dict: Access check results
+    """
+    try:
+        response = (session or requests).head(url, timeout=timeout, allow_redirects=True)
+        return {
+            'accessible': response.status_code == 200,
+            'status_code': response.status_code,
+            'error': None if response.status_code == 200 else f'HTTP {response.status_code}'
+        }
+    except Exception as e:
+        return {
+            'accessible': False,
+            'status_code': None,
+            'error': str(e)
+        }
+
+def delete_image(delete_url):
+    """
+    Delete an image using the delete URL (if available)
+    
+    Args:
+        delete_url: Delete URL returned from upload
+        
+    Returns:
+        bool: Whether deletion was successful
+    """
+    if not delete_url:
+        return False
+    
+    try:
+        response = requests.get(delete_url, timeout=10)
+        return response.status_code == 200
+    except:
+        return False
+
+class ImageHost(ABC):
+    """Interface of an image-host backend"""
+
+    name = None
+    rate_limited = True     # whether uploads need pacing and backoff
+
+    @abstractmethod
+    def upload(self, image_path, session=None) -> dict:
+        """Publish one image file; returns the upload_to_freeimage() result dict"""
+
+    def verify(self, url, session=None) -> dict:
+        return verify_image_access(url, session=session)
+
+    def is_throttled(self, result) -> bool:
+        """Whether a failed upload looks like rate limiting rather than a bad file"""
+        return False
+
+class FreeimageHost(ImageHost):
+
+    name = 'freeimage'
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def upload(self, image_path, session=None) -> dict:
+        return upload_to_freeimage(image_path, self.api_key, session=session)
+
+    def is_throttled(self, result) -> bool:
+        if result.get('status_code') in (403, 429):
+            return True
+        return 'rate limit' in str(result.get('error', '')).lower()
+
+class LocalImageHost(ImageHost):
+    """
+    Stores each image as <root>/<aa>/<sha256><ext>, hard-linked when possible,
+    and hands out urls under base_url. The same image uploaded twice lands on
+    the same file and url. Serve the directory with serve().
+    """
+
+    name = 'local'
+    rate_limited = False
+
+    def __init__(self, root='hosted-images', base_url=None):
+        self.root = root
+        self.base_url = (base_url or os.getenv('IMAGE_HOST_URL') or 'http://127.0.0.1:8800').rstrip('/')
+
+    def upload(self, image_path, session=None) -> dict:
+        try:
+            with open(image_path, 'rb') as f:
+                content_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+            name = f"{content_hash[:2]}/{content_hash}{os.path.splitext(image_path)[1].lower()}"
+            target = os.path.join(self.root, name)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # uploader threads may store the same image at once, give each its own tmp
+                tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    os.link(image_path, tmp)
+                except OSError:
+                    shutil.copyfile(image_path, tmp)
+                os.replace(tmp, target)
+        except FileNotFoundError:
+            return {
+                'success': False,
+                'error': f'File not found: {image_path}'
+            }
+        except OSError as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+        url = f"{self.base_url}/{name}"
+        return {
+            'success': True,
+            'url': url,
+            'display_url': url,
+            'thumb_url': None,
+            'delete_url': None,
+            'image_id': content_hash
+        }
+
+    def verify(self, url, session=None) -> dict:
+        # the file is the source of truth; verify-hosted-images.py checks the server itself
+        path = os.path.join(self.root, url[len(self.base_url) + 1:])
+        accessible = url.startswith(self.base_url + '/') and os.path.isfile(path)
+        return {
+            'accessible': accessible,
+            'status_code': 200 if accessible else 404,
+            'error': None if accessible else 'HTTP 404'
+        }
+
+class ImmutableFileHandler(SimpleHTTPRequestHandler):
+    """Static files whose names are their content hash, so they never change"""
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(root='hosted-images', port=8800, bind='127.0.0.1'):
+    """Serve a LocalImageHost directory over HTTP until interrupted"""
+    os.makedirs(root, exist_ok=True)
+    server = ThreadingHTTPServer((bind, port), partial(ImmutableFileHandler, directory=root))
+    print(f"Serving {os.path.abspath(root)} at http://{bind}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'serve':
+        print("usage: python imagehosts.py serve [root] [port]")
+        sys.exit(1)
+    root_folder = os.path.dirname(os.path.abspath(__file__))
+    serve(root=sys.argv[2] if len(sys.argv) > 2 else os.path.join(root_folder, "../hosted-images"),
+          port=int(sys.argv[3]) if len(sys.argv) > 3 else 8800)
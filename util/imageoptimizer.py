@@ -0,0 +1,105 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from uploadjournal import entry_key, image_path
+
+"""
+Shrink images before they are uploaded.
+
+Many source photos are several times larger than the site ever displays them.
+optimize_images() downscales each one to a maximum dimension and recompresses
+it as JPEG or WebP in a process pool. Results are cached in a directory keyed
+by the SHA-256 of the source bytes plus the settings, so re-runs and duplicate
+files cost nothing. Needs Pillow.
+"""
+
+FORMATS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+def cached_name(content_hash, max_dimension, quality, image_format) -> str:
+    return f"{content_hash}-{max_dimension}-q{quality}{FORMATS[image_format]}"
+
+
+def optimize_image(source, cache_dir, max_dimension=1600, quality=82, image_format='JPEG', content_hash=None):
+    """
+    Downscale and recompress one image into cache_dir. Runs in a worker process.
+
+    Returns: (optimized path, source size, optimized size). The optimized path
+    is None when recompressing did not make the file smaller.
+    """
+    from PIL import Image, ImageOps
+
+    source_size = os.path.getsize(source)
+    if content_hash is None:
+        with open(source, 'rb') as f:
+            content_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+    output = os.path.join(cache_dir, cached_name(content_hash, max_dimension, quality, image_format))
+
+    if not os.path.exists(output):
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)     # bake in the camera rotation, EXIF is dropped
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            tmp = output + f".{os.getpid()}.tmp"
+            if image_format == 'JPEG':
+                image.save(tmp, 'JPEG', quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(tmp, 'WEBP', quality=quality, method=6)
+        os.replace(tmp, output)
+
+    optimized_size = os.path.getsize(output)
+    if optimized_size >= source_size:
+        return None, source_size, source_size
+    return output, source_size, optimized_size
+
+
+def optimize_images(entries, images_folder, cache_dir='optimized-images', max_dimension=1600, quality=82,
+                    image_format='JPEG', workers=None) -> dict:
+    """
+    Optimize the images of dataset entries in a process pool.
+
+    Args:
+        entries: Dataset entries; content_hash from the indexer's fingerprint pass is reused when present
+        images_folder: Root directory holding the car folders the entries were indexed from
+        cache_dir: Directory holding the optimized files
+        max_dimension: Longest side of the optimized image in pixels
+        quality: JPEG/WebP quality (1-95)
+        image_format: 'JPEG' or 'WEBP'
+        workers: Number of worker processes (default: one per CPU)
+
+    Returns: dict of entry_key -> optimized file path, only for the images
+    that got smaller
+    """
+    image_format = image_format.upper()
+    if image_format not in FORMATS:
+        raise ValueError(f"image_format must be one of {', '.join(FORMATS)}")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    sources = {entry_key(entry): (image_path(images_folder, entry), entry.get('content_hash')) for entry in entries}
+    print(f"Optimizing {len(sources)} images (max {max_dimension}px, {image_format} q{quality})...")
+
+    optimized = {}
+    source_bytes = optimized_bytes = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(optimize_image, source, cache_dir, max_dimension, quality, image_format, content_hash): key
+                   for key, (source, content_hash) in sources.items()}
+        for i, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            source = sources[key][0]
+            try:
+                output, source_size, optimized_size = future.result()
+            except Exception as e:
+                print(f"Error optimizing '{source}', uploading the original: {e}")
+                continue
+            source_bytes += source_size
+            optimized_bytes += optimized_size
+            if output:
+                optimized[key] = output
+            if i % 500 == 0:
+                print(f"  {i}/{len(sources)} optimized")
+
+    if source_bytes:
+        print(f"Optimized {len(optimized)} images: {source_bytes / 1e6:.1f} MB -> {optimized_bytes / 1e6:.1f} MB "
+              f"({100 * (1 - optimized_bytes / source_bytes):.0f}% smaller)")
+    return optimized
@@ -1,255 +1,270 @@
-import json
 import os
-import random
 import requests
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
+from imagehosts import FreeimageHost, LocalImageHost
+from uploadjournal import UploadJournal, entry_key, image_path
 
-def upload_to_freeimage(image_path, api_key):
-    """
-    Upload an image to Freeimage.host
-    
-    Args:
-        image_path: Full path to the image file
-        api_key: Your Freeimage.host API key
-    
-    Returns:
-        dict: Response data including image URL
-    """
-    url = "https://freeimage.host/api/1/upload"
-    
-    try:
-        # Open the image file
-        with open(image_path, 'rb') as image_file:
-            # Prepare the request
-            files = {
-                'source': image_file
-            }
-            
-            data = {
-                'key': api_key,
-                'action': 'upload',
-                'format': 'json',
-                'type': 'file',
-                'nsfw': '0'
-            }
-            
-            # Make the POST request
-            response = requests.post(url, files=files, data=data)
-            
-            # Check if request was successful
-            if response.status_code == 200:
-                result = response.json()
-                
-                if result.get('status_code') == 200:
-                    return {
-                        'success': True,
-                        'url': result['image']['url'],
-                        'display_url': result['image']['display_url'],
-                        'delete_url': result['image'].get('delete_url'),
-                        'thumb_url': result['image'].get('thumb', {}).get('url'),
-                        'image_id': result['image'].get('id'),
-                        'raw_response': result
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': result.get('error', {}).get('message', 'Unknown error'),
-                        'error_code': result.get('error', {}).get('code'),
-                        'raw_response': result
-                    }
-            else:
-                return {
-                    'success': False,
-                    'error': f'HTTP {response.status_code}: {response.text}'
-                }
-    
-    except FileNotFoundError:
-        return {
-            'success': False,
-            'error': f'File not found: {image_path}'
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+# metrics.py lives with the seeder, one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from metrics import RequestMetrics, instrument_session
 
-def verify_image_access(url, timeout=10):
-    """
-    Verify that an uploaded image is accessible
-    
-    Args:
-        url: Image URL to check
-        timeout: Request timeout in seconds
-    
-    Returns:
-        dict: Access check results
-    """
-    try:
-        response = requests.head(url, timeout=timeout, allow_redirects=True)
-        return {
-            'accessible': response.status_code == 200,
-            'status_code': response.status_code,
-            'error': None if response.status_code == 200 else f'HTTP {response.status_code}'
-        }
-    except Exception as e:
-        return {
-            'accessible': False,
-            'status_code': None,
-            'error': str(e)
-        }
+# image host requests, as recorded in the metrics
+IMAGE_OPERATIONS = {'POST': 'upload', 'HEAD': 'verify', 'GET': 'verify'}
 
-def delete_image(delete_url):
-    """
-    Delete an image using the delete URL (if available)
-    
-    Args:
-        delete_url: Delete URL returned from upload
-        
-    Returns:
-        bool: Whether deletion was successful
+class TokenBucket:
     """
-    if not delete_url:
-        return False
-    
-    try:
-        response = requests.get(delete_url, timeout=10)
-        return response.status_code == 200
-    except:
-        return False
+    Token-bucket rate limiter shared by the upload workers, which adapts to the host.
 
-def save_dataset(dataset, dataset_json):
-    """
-    Save the dataset to JSON file
+    Every upload takes one token; tokens refill at `rate` per second up to `burst`.
+    A throttled upload halves the rate and pauses everyone, starting at
+    `backoff_seconds` and doubling on repeated throttling up to `max_pause`.
+    Each clean upload raises the rate again a little, up to `max_rate`, so the
+    bucket settles just under what the host actually allows.
     """
-    with open(dataset_json, 'w', encoding='utf-8') as f:
-        json.dump(dataset, f, indent=2, ensure_ascii=False)
+
+    def __init__(self, rate, max_rate=None, burst=1, backoff_seconds=30, max_pause=3600):
+        self.initial_rate = rate
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.min_rate = rate / 16
+        self.burst = burst
+        self.backoff_seconds = backoff_seconds
+        self.max_pause = max_pause
+        self.pause = 0
+        self.paused_until = 0
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until an upload may start"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self, reason):
+        """The host throttled us: slow down and pause all workers"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return  # uploads that were already in flight report the same throttle
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.pause = min(self.max_pause, max(self.backoff_seconds, self.pause * 2))
+            self.paused_until = now + self.pause
+            self.tokens = 0
+            self.updated = self.paused_until
+            print(f"  ⏸ Throttled ({reason}). Pausing {self.pause:.0f}s, then {self.rate * 60:.1f} uploads/min")
+
+    def success(self):
+        """A clean upload: probe a little faster and forget old pauses gradually"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.initial_rate * 0.05)
+            self.pause = self.pause / 2 if self.pause > self.backoff_seconds else 0
 
 def upload_car_dataset(dataset_json='car_dataset.json', api_key=None, delay_seconds=5, 
-                       rate_limit_pause=3600, max_retries=3):
+                       rate_limit_pause=3600, max_retries=3, workers=4,
+                       rate_per_minute=None, max_rate_per_minute=None, verify_delay=2,
+                       optimize=False, max_dimension=1600, quality=82, image_format='JPEG',
+                       host=None, rehost=False, metrics=None, images_folder=None):
     """
-    Upload all images from car_dataset.json to Freeimage.host
-    Detects rate limiting and pauses when needed
+    Upload all images from car_dataset.json to an image host (Freeimage.host by default)
+    Uploads run on `workers` threads. For rate-limited hosts they are paced by a
+    shared adaptive token bucket that backs off on 403/429 or uploads that
+    turn out inaccessible.
+    Every attempt is appended to the upload journal; the journal is compacted
+    back into dataset_json when the run ends
     
     Args:
         dataset_json: Path to the JSON file (will be updated in place)
-        api_key: Your Freeimage.host API key
-        delay_seconds: Delay between uploads
-        rate_limit_pause: How long to pause when rate limit detected (in seconds, default 1 hour)
+        api_key: Your Freeimage.host API key (not needed when host is given)
+        delay_seconds: Starting delay between uploads, used when rate_per_minute is not given
+        rate_limit_pause: Longest pause when rate limiting is detected (in seconds, default 1 hour)
         max_retries: Maximum retry attempts for failed uploads
+        workers: Number of uploads in flight at once
+        rate_per_minute: Starting upload rate (default 60 / delay_seconds)
+        max_rate_per_minute: Highest rate the limiter probes up to (default 10x the starting rate)
+        verify_delay: Seconds to wait after an upload before checking the image is reachable
+        optimize: Downscale and recompress images before uploading (needs Pillow)
+        max_dimension: Longest side of an optimized image in pixels
+        quality: JPEG/WebP quality of optimized images
+        image_format: 'JPEG' or 'WEBP' for optimized images
+        host: ImageHost backend to upload to (default FreeimageHost(api_key))
+        rehost: Also upload images already hosted on a different host, replacing their urls
+        metrics: optional RequestMetrics the upload and verify requests are recorded in
+        images_folder: Root directory of the car folders (default vehicle-images next to dataset_json)
     """
     
-    if not api_key:
-        print("ERROR: API key is required!")
-        print("Get your API key from: https://freeimage.host/page/api")
-        return
+    if host is None:
+        if not api_key:
+            print("ERROR: API key is required!")
+            print("Get your API key from: https://freeimage.host/page/api")
+            return
+        host = FreeimageHost(api_key)
     
-    # Load the dataset
+    # Load the dataset, with the attempts of earlier runs replayed over it
+    journal = UploadJournal(dataset_json)
     try:
-        with open(dataset_json, 'r', encoding='utf-8') as f:
-            dataset = json.load(f)
+        dataset = journal.load()
     except FileNotFoundError:
         print(f"ERROR: {dataset_json} not found!")
         return
     
     print(f"Loaded {len(dataset)} total images")
     
-    # Count how many already have URLs
-    already_uploaded = sum(1 for entry in dataset if entry.get('hosted_url') and entry.get('upload_status') == 'success')
-    to_upload = len(dataset) - already_uploaded
+    # Count how many already have live URLs (entries from before image_host existed are on Freeimage)
+    def uploaded(entry):
+        return (entry.get('hosted_url') and entry.get('upload_status') == 'success' and not entry.get('link_dead')
+                and (not rehost or entry.get('image_host', FreeimageHost.name) == host.name))
+    already_uploaded = sum(1 for entry in dataset if uploaded(entry))
+    duplicates = sum(1 for entry in dataset if entry.get('duplicate_of') and not entry.get('hosted_url'))
+    pending = [entry for entry in dataset
+               if not uploaded(entry)
+               and not entry.get('duplicate_of')]
+    exhausted = sum(1 for entry in pending if entry.get('retry_count', 0) >= max_retries)
+    pending = [entry for entry in pending if entry.get('retry_count', 0) < max_retries]
+    
+    rate_per_minute = rate_per_minute or 60 / delay_seconds
+    max_rate_per_minute = max_rate_per_minute or rate_per_minute * 10
+    bucket = None
+    if host.rate_limited:
+        bucket = TokenBucket(rate_per_minute / 60, max_rate_per_minute / 60,
+                             burst=workers, max_pause=rate_limit_pause)
+    else:
+        verify_delay = 0
     
     print(f"Already uploaded: {already_uploaded}")
-    print(f"To upload: {to_upload}")
-    print(f"Starting upload process...\n")
+    print(f"Duplicates (never uploaded): {duplicates}")
+    print(f"Skipping (max retries exceeded): {exhausted}")
+    print(f"To upload: {len(pending)}")
+    if bucket:
+        print(f"Starting upload to {host.name} with {workers} workers at {rate_per_minute:.1f}-{max_rate_per_minute:.1f} uploads/min...\n")
+    else:
+        print(f"Starting upload to {host.name} with {workers} workers, unthrottled...\n")
+    
+    # dataset file paths are relative to their car folder under images_folder
+    images_folder = images_folder or os.path.join(os.path.dirname(os.path.abspath(dataset_json)), 'vehicle-images')
+
+    # Optionally shrink the images first; the smaller file is uploaded in place of the original
+    optimized = {}
+    if optimize and pending:
+        from imageoptimizer import optimize_images
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(dataset_json)), 'optimized-images')
+        optimized = optimize_images(pending, images_folder, cache_dir, max_dimension=max_dimension,
+                                    quality=quality, image_format=image_format)
+        print()
     
     # Track statistics
-    successful = 0
-    failed = 0
-    skipped = 0
-    uploads_this_session = 0
-    consecutive_403s = 0
+    stats = {'successful': 0, 'failed': 0, 'done': 0}
+    lock = threading.Lock()     # guards the entries, stats and the journal
+    local = threading.local()   # one keep-alive session per worker
     
-    # Process each image
-    idx: int = 0
-    for entry in dataset:
-        idx += 1       
-
-        # Skip if already successfully uploaded
-        if entry.get('hosted_url') and entry.get('upload_status') == 'success':
-            skipped += 1
-            print(f"[{idx}/{len(dataset)}] Skipping (already uploaded): {Path(entry['file_path']).name}")
-            continue
-        
-        file_path = entry['file_path']
+    def upload_entry(entry):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            if metrics:
+                instrument_session(local.session, metrics, 'images', IMAGE_OPERATIONS)
+        session = local.session
+        file_path = optimized.get(entry_key(entry)) or image_path(images_folder, entry)
+        name = Path(entry['file_path']).name
         retry_count = entry.get('retry_count', 0)
         
-        # Skip if too many retries
-        if retry_count >= max_retries:
-            print(f"[{idx}/{len(dataset)}] Skipping (max retries exceeded): {Path(file_path).name}")
-            continue
-        
-        print(f"[{idx}/{len(dataset)}] Uploading: {Path(file_path).name}" + 
-              (f" (retry {retry_count + 1})" if retry_count > 0 else ""))
-        
-        # Upload the image
-        result = upload_to_freeimage(file_path, api_key)
-        
-        if result['success']:
-            uploads_this_session += 1
+        throttled = 0
+        while True:
+            if bucket:
+                bucket.acquire()
+            result = host.upload(file_path, session=session)
             
-            # CRITICAL: Verify immediately
-            print(f"  → Verifying accessibility...")
-            time.sleep(2 + random.randint(0, 5))  # Brief delay before verification
-            access_check = verify_image_access(result['url'])
+            if result['success']:
+                # CRITICAL: Verify immediately
+                time.sleep(verify_delay)
+                access_check = host.verify(result['url'], session=session)
+                if access_check['accessible']:
+                    break
+                # UPLOAD RETURNED 200 BUT IMAGE IS INACCESSIBLE (RATE LIMITED!)
+                reason = f"uploaded but inaccessible: {access_check['error']}"
+            elif host.is_throttled(result):
+                reason = result['error'][:80]
+            else:
+                break
             
-            if access_check['accessible']:
-                # SUCCESS!
+            if bucket:
+                bucket.backoff(reason)
+            throttled += 1
+            if throttled >= max_retries:
+                break
+        
+        with lock:
+            stats['done'] += 1
+            progress = f"[{stats['done']}/{len(pending)}]"
+            if result['success'] and access_check['accessible']:
+                if bucket:
+                    bucket.success()
                 entry['hosted_url'] = result['url']
                 entry['display_url'] = result['display_url']
                 entry['thumb_url'] = result.get('thumb_url')
                 entry['delete_url'] = result.get('delete_url')
                 entry['image_id'] = result.get('image_id')
+                entry['image_host'] = host.name
                 entry['upload_status'] = 'success'
                 entry['access_verified'] = True
                 entry['last_upload_time'] = datetime.now().isoformat()
-                if 'retry_count' in entry:
-                    del entry['retry_count']
-                
-                successful += 1
-                consecutive_403s = 0
-                print(f"  ✓ Success: {result['url']}")
-                
+                entry.pop('retry_count', None)
+                entry.pop('upload_error', None)
+                entry.pop('link_dead', None)
+                stats['successful'] += 1
+                print(f"{progress} ✓ {name}: {result['url']}")
+            elif throttled >= max_retries:
+                # still throttled after backing off; leave it for the next run without using up its retries
+                entry['upload_status'] = 'rate_limited'
+                entry['upload_error'] = reason
+                entry['last_upload_time'] = datetime.now().isoformat()
+                stats['failed'] += 1
+                print(f"{progress} ✗ {name}: rate limited ({reason})")
             else:
-                # UPLOAD RETURNED 200 BUT IMAGE IS INACCESSIBLE (RATE LIMITED!)
-                print(f"  ✗ Upload returned 200 but image is INACCESSIBLE: {access_check['error']}")
-                    
-                failed += 1
-        else:
-            # Upload itself failed
-            entry['upload_status'] = 'failed'
-            entry['upload_error'] = result['error']
-            entry['retry_count'] = retry_count + 1
-            entry['last_upload_time'] = datetime.now().isoformat()
-            failed += 1
-            print(f"  ✗ Upload failed: {result['error']}")
-        
-        # Save after each attempt
-        save_dataset(dataset, dataset_json)
-        
-        # Delay between uploads
-        time.sleep(delay_seconds)
+                # Upload itself failed
+                entry['upload_status'] = 'failed'
+                entry['upload_error'] = result['error']
+                entry['retry_count'] = retry_count + 1
+                entry['last_upload_time'] = datetime.now().isoformat()
+                stats['failed'] += 1
+                print(f"{progress} ✗ {name}: upload failed: {result['error']}")
+            
+            # Journal each attempt, O(1) and crash-safe
+            journal.record(entry)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(upload_entry, entry) for entry in pending]:
+                future.result()
+    finally:
+        journal.compact(dataset)
     
     # Print summary
     print("\n" + "="*60)
     print("UPLOAD COMPLETE!")
     print("="*60)
     print(f"Total images: {len(dataset)}")
-    print(f"Skipped (already uploaded): {skipped}")
-    print(f"Newly uploaded: {successful}")
-    print(f"Failed/Rate limited: {failed}")
+    print(f"Skipped (already uploaded): {already_uploaded}")
+    print(f"Newly uploaded: {stats['successful']}")
+    print(f"Failed/Rate limited: {stats['failed']}")
+    if bucket:
+        print(f"Final rate: {bucket.rate * 60:.1f} uploads/min")
     print(f"Dataset saved to: {dataset_json}")
     
     # Show images that need retry
@@ -264,10 +279,37 @@ if __name__ == "__main__":
     load_dotenv()
     root_folder = os.path.dirname(os.path.abspath(__file__)) 
 
+    dataset_json = os.path.join(root_folder, "../car_dataset.json")
+
+    # --compact: just fold the upload journal back into the dataset
+    if '--compact' in sys.argv:
+        journal = UploadJournal(dataset_json)
+        journal.compact(journal.load())
+        sys.exit(0)
+
+    # --host local: publish into ../hosted-images instead (serve it with `python imagehosts.py serve`)
+    host = None
+    if '--host' in sys.argv:
+        position = sys.argv.index('--host') + 1
+        choice = sys.argv[position] if position < len(sys.argv) else None
+        if choice not in ('freeimage', 'local'):
+            print("usage: python upload-to-freeimage.py [--host freeimage|local] [--rehost] [--optimize] [--compact]")
+            sys.exit(1)
+        if choice == 'local':
+            host = LocalImageHost(os.path.join(root_folder, "../hosted-images"))
+
+    metrics = RequestMetrics()
     result = upload_car_dataset(
-        dataset_json=os.path.join(root_folder, "../car_dataset.json"),
+        dataset_json=dataset_json,
+        images_folder=os.path.join(root_folder, "../vehicle-images"),
         api_key=os.getenv("API_KEY"),
-        delay_seconds=5,         # 5 seconds between uploads
-        rate_limit_pause=3600,   # Wait 1 hour when rate limit detected
-        max_retries=3            # Try each image up to 3 times
-    )
\ No newline at end of file
+        host=host,
+        rehost='--rehost' in sys.argv,   # Move images hosted elsewhere onto this host too
+        delay_seconds=5,         # start at one upload every 5 seconds, then probe faster
+        rate_limit_pause=3600,   # Pause at most 1 hour when rate limit detected
+        max_retries=3,           # Try each image up to 3 times
+        workers=4,               # Uploads in flight at once
+        optimize='--optimize' in sys.argv,   # Shrink to 1600px JPEGs before uploading
+        metrics=metrics,
+    )
+    metrics.print_summary()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import json
+import os
+
+"""
+Append-only journal of per-image upload state, kept next to car_dataset.json.
+
+Rewriting the whole dataset after every upload attempt costs O(n) per attempt
+and can leave a half-written file behind on a crash. Instead every attempt
+appends one JSON line with the changed fields of one image:
+
+    {"key": ["Make Model Year", "file.jpg"], "fields": {"hosted_url": "...", "retry_count": null}}
+
+A null value means the field was removed. Loading replays the journal over the
+dataset, later lines winning; a torn last line from a crash is ignored.
+compact() folds the journal back into car_dataset.json and empties it.
+"""
+
+# fields the uploader owns; everything else in an entry belongs to the indexer
+UPLOAD_FIELDS = ['hosted_url', 'display_url', 'thumb_url', 'delete_url', 'image_id', 'image_host',
+                 'upload_status', 'upload_error', 'access_verified', 'link_dead', 'retry_count', 'last_upload_time']
+
+
+def entry_folder(entry) -> str:
+    """
+    Name of the folder an entry was indexed from. Entries written before the
+    folder was recorded fall back to the name rebuilt from the parsed fields.
+    """
+    return entry.get('folder') or f"{entry['make']} {entry['model']} {entry['year']}"
+
+
+def entry_key(entry) -> tuple:
+    """
+    Identity of an image, shared by the indexer, journal and uploader. File
+    names repeat across car folders, and folders that differ only in spacing
+    parse to the same make, model and year, so it is the folder and the file.
+    """
+    return (entry_folder(entry), entry['file_path'])
+
+
+def image_path(root_folder, entry) -> str:
+    """Full path of a dataset entry's image; file_path is relative to its car folder"""
+    return os.path.join(root_folder, entry_folder(entry), entry['file_path'])
+
+
+def journal_path(dataset_json) -> str:
+    return os.path.splitext(dataset_json)[0] + ".journal.jsonl"
+
+
+class UploadJournal:
+
+    def __init__(self, dataset_json = 'car_dataset.json', path = None, fsync = True):
+        """
+        Args:
+            dataset_json: dataset the journal belongs to
+            path: journal file (default <dataset>.journal.jsonl)
+            fsync: force every record to disk before returning
+        """
+        self.dataset_json = dataset_json
+        self.path = path or journal_path(dataset_json)
+        self.fsync = fsync
+        self._file = None
+
+    def load(self) -> list:
+        """The dataset with the journal replayed over it"""
+        with open(self.dataset_json, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+        replayed = self.replay(dataset)
+        if replayed:
+            print(f"Replayed {replayed} journal records from {self.path}")
+        return dataset
+
+    def replay(self, dataset) -> int:
+        by_key = {entry_key(entry): entry for entry in dataset}
+        # journals written before keys carried the folder: (make, model, year, file_path)
+        by_fields = {(entry['make'], entry['model'], entry['year'], entry['file_path']): entry for entry in dataset}
+        replayed = 0
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return 0
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue    # torn write from a crash
+                key = tuple(record['key'])
+                entry = (by_key if len(key) == 2 else by_fields).get(key)
+                if entry is None:
+                    continue    # the image was dropped from the index since
+                apply_fields(entry, record['fields'])
+                replayed += 1
+        return replayed
+
+    def record(self, entry, fields = UPLOAD_FIELDS):
+        """Append the current value of `fields` of one entry"""
+        self.append(entry_key(entry), {name: entry.get(name) for name in fields})
+
+    def append(self, key, fields):
+        if self._file is None:
+            self._drop_torn_line()
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps({"key": list(key), "fields": fields}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _drop_torn_line(self):
+        """
+        Cut the journal back to its last complete line, so the first record
+        after a crash is not glued onto a torn one (and skipped with it).
+        """
+        try:
+            f = open(self.path, 'rb+')
+        except FileNotFoundError:
+            return
+        with f:
+            end = pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                newline = f.read(step).rfind(b"\n")
+                if newline >= 0:
+                    pos += newline + 1 - step
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+                print(f"Dropped a torn record ({end - pos} bytes) from the end of {self.path}")
+
+    def compact(self, dataset):
+        """
+        Write the dataset (journal already applied) to dataset_json and empty
+        the journal. Replaying is idempotent, so a crash in between is harmless.
+        """
+        tmp = self.dataset_json + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(dataset, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.dataset_json)
+
+        self.close()
+        open(self.path, 'w').close()
+        print(f"Compacted upload journal into {self.dataset_json}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def apply_fields(entry, fields):
+    for name, value in fields.items():
+        if value is None:
+            entry.pop(name, None)
+        else:
+            entry[name] = value
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+import httpx
+from uploadjournal import UploadJournal, entry_key
+
+# metrics.py lives with the seeder, one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from metrics import RequestMetrics
+
+"""
+Re-check every hosted_url in car_dataset.json.
+
+All urls are checked concurrently over one pooled keep-alive client. Each image
+gets its HTTP status, latency and check time; 404/410 answers mark the link
+dead, and the vehicle catalog leaves dead links out, so create_project never
+samples them. Results go through the upload journal and are compacted into
+the dataset at the end.
+
+    python verify-hosted-images.py [--concurrency 50]
+"""
+
+# fields this pass owns in a dataset entry
+VERIFY_FIELDS = ['access_verified', 'link_dead', 'verify_status', 'verify_latency_ms', 'verify_error', 'verified_at']
+DEAD_STATUSES = {404, 410}
+
+
+async def check_url(client, url, retries=1, metrics=None):
+    """
+    HEAD one url (falling back to a one-byte GET for hosts that refuse HEAD).
+    Network errors are retried, since a dead link is only ever a definite answer.
+    Every attempt is recorded in metrics, if given.
+
+    Returns: dict with status (None on network error), latency_ms and error
+    """
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = await client.head(url)
+            if response.status_code in (405, 501):
+                response = await client.get(url, headers={'Range': 'bytes=0-0'})
+            status = response.status_code
+            if metrics:
+                metrics.record('images', 'verify', time.perf_counter() - started, error=status not in (200, 206))
+            return {
+                'status': 200 if status == 206 else status,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                'error': None if status in (200, 206) else f'HTTP {status}'
+            }
+        except httpx.HTTPError as e:
+            if metrics:
+                metrics.record('images', 'verify', time.perf_counter() - started, error=True, retries=attempt)
+            error = f"{type(e).__name__}: {e}"
+    return {'status': None, 'latency_ms': None, 'error': error}
+
+
+async def verify_entries(entries, concurrency=50, timeout=15, http2=False, on_result=None, metrics=None):
+    """
+    Check the hosted_url of every entry, at most `concurrency` at a time.
+    on_result(entry, result) is called as each check finishes.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True, http2=http2) as client:
+        async def bounded(entry):
+            async with semaphore:
+                result = await check_url(client, entry['hosted_url'], metrics=metrics)
+            if on_result:
+                on_result(entry, result)
+            return result
+
+        return await asyncio.gather(*(bounded(entry) for entry in entries))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def verify_hosted_images(dataset_json='car_dataset.json', concurrency=50, timeout=15, http2=False, metrics=None):
+    """
+    Verify every hosted image of the dataset and record the outcome on its entry.
+
+    Args:
+        dataset_json: Path to the JSON file (updated through the upload journal)
+        concurrency: Requests in flight at once
+        timeout: Per-request timeout in seconds
+        http2: Talk HTTP/2 to hosts that support it
+        metrics: optional RequestMetrics every check is recorded in
+    """
+    # results are cheap to recompute, so skip the per-record fsync the uploader needs
+    journal = UploadJournal(dataset_json, fsync=False)
+    try:
+        dataset = journal.load()
+    except FileNotFoundError:
+        print(f"ERROR: {dataset_json} not found!")
+        return
+
+    hosted = [entry for entry in dataset if entry.get('hosted_url')]
+    print(f"Verifying {len(hosted)} hosted images, {concurrency} at a time...")
+
+    done = 0
+    def on_result(entry, result):
+        nonlocal done
+        entry['verify_status'] = result['status']
+        entry['verify_latency_ms'] = result['latency_ms']
+        entry['verify_error'] = result['error']
+        entry['verified_at'] = datetime.now().isoformat()
+        entry['access_verified'] = result['status'] == 200
+        entry['link_dead'] = True if result['status'] in DEAD_STATUSES else None
+        journal.append(entry_key(entry), {name: entry.get(name) for name in VERIFY_FIELDS})
+        done += 1
+        if done % 500 == 0:
+            print(f"  {done}/{len(hosted)} checked")
+
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(verify_entries(hosted, concurrency, timeout, http2, on_result, metrics))
+    finally:
+        journal.compact(dataset)
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+    latencies = [result['latency_ms'] for result in results if result['latency_ms'] is not None]
+
+    print("\n" + "="*60)
+    print("VERIFICATION COMPLETE!")
+    print("="*60)
+    print(f"Checked {len(results)} images in {elapsed:.1f}s ({len(results) / max(elapsed, 1e-9):.0f}/s)")
+    for status, count in sorted(statuses.items(), key=lambda item: -item[1]):
+        print(f"  {status if status is not None else 'network error'}: {count}")
+    if latencies:
+        print(f"Latency p50 {percentile(latencies, 0.5):.0f} ms, p95 {percentile(latencies, 0.95):.0f} ms, "
+              f"max {max(latencies):.0f} ms")
+    print(f"Dead links (skipped when sampling): {sum(1 for entry in hosted if entry.get('link_dead'))}")
+    return dataset
+
+
+if __name__ == "__main__":
+    root_folder = os.path.dirname(os.path.abspath(__file__))
+    concurrency = int(sys.argv[sys.argv.index('--concurrency') + 1]) if '--concurrency' in sys.argv else 50
+
+    metrics = RequestMetrics()
+    verify_hosted_images(
+        dataset_json=os.path.join(root_folder, "../car_dataset.json"),
+        concurrency=concurrency,
+        metrics=metrics
+    )
+    metrics.print_summary()
@@ -0,0 +1,302 @@
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+from array import array
+from processlock import file_lock
+
+"""
+Compiled, memory-mappable form of car_dataset.json.
+
+The JSON is parsed once into a binary catalog next to it: every distinct string
+(make, model, year, url, file name) is stored once, each row is a handful of
+uint32 string ids held in columns, and the rows with a hosted_url that was
+not found dead are listed in a separate index, sorted by make, model and year
+with the group boundaries stored alongside. Opening the catalog is an mmap, sampling is two
+array lookups, and worker processes share the same pages.
+
+The catalog records the size and mtime of the JSON it was built from and is
+rebuilt automatically when those change, by one process at a time: the others
+wait on a lock file and then open what it wrote.
+
+    python vehiclecatalog.py [car_dataset.json]
+"""
+
+MAGIC = b"EVCAT002"
+# source mtime_ns, source size, little-endian flag, rows, hosted rows, strings,
+# then the number of make / make+model / make+model+year groups
+HEADER = struct.Struct("<8sqqIIIIIII")
+COLUMNS = ["make", "model", "year", "hosted_url", "file_path"]
+# hosted rows are grouped at each of these levels, widest first
+GROUP_LEVELS = [("make",), ("make", "model"), ("make", "model", "year")]
+MISSING = 0xFFFFFFFF
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def catalog_path(dataset_json) -> str:
+    return os.path.splitext(dataset_json)[0] + ".catalog"
+
+
+def compile_catalog(dataset_json = 'car_dataset.json', output = None) -> str:
+    """Parse the dataset JSON and write its binary catalog; returns the catalog path"""
+    output = output or catalog_path(dataset_json)
+    stat = os.stat(dataset_json)
+    with open(dataset_json, 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+
+    strings = {}
+    def intern(value):
+        if not value:
+            return MISSING
+        value = str(value)
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    columns = {name: array('I') for name in COLUMNS}
+    hosted = []
+    for row, entry in enumerate(dataset):
+        for name in COLUMNS:
+            columns[name].append(intern(entry.get(name)))
+        if entry.get('hosted_url') and not entry.get('link_dead'):
+            hosted.append(row)
+
+    # sort hosted rows so every make, model and year is one contiguous range
+    def key(row, fields = GROUP_LEVELS[-1]):
+        return tuple(str(dataset[row].get(name) or '') for name in fields)
+    hosted.sort(key=key)
+    hosted = array('I', hosted)
+
+    groups = []
+    for fields in GROUP_LEVELS:
+        starts = array('I')
+        previous = None
+        for i, row in enumerate(hosted):
+            current = key(row, fields)
+            if current != previous:
+                starts.append(i)
+                previous = current
+        groups.append(starts)
+
+    blob = bytearray()
+    offsets = array('I', [0])
+    for value in strings:
+        blob += value.encode('utf-8')
+        offsets.append(len(blob))
+
+    tmp = f"{output}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size, sys.byteorder == 'little',
+                            len(dataset), len(hosted), len(strings), *(len(starts) for starts in groups)))
+        f.write(offsets.tobytes())
+        for name in COLUMNS:
+            f.write(columns[name].tobytes())
+        f.write(hosted.tobytes())
+        for starts in groups:
+            f.write(starts.tobytes())
+        f.write(blob)
+    try:
+        os.replace(tmp, output)
+    except PermissionError:
+        # Windows will not replace a file that is still mapped
+        os.remove(tmp)
+        raise PermissionError(f"{output} is still open (a running planner holds the old catalog); "
+                              f"finish the run before rebuilding it") from None
+
+    print(f"Compiled {len(dataset)} vehicles ({len(hosted)} hosted, {len(strings)} distinct strings) into {output}")
+    return output
+
+
+class VehicleCatalog:
+    """Read-only view over a compiled catalog file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.source_mtime_ns, self.source_size, little_endian,
+         self.rows, hosted_rows, n_strings, *n_groups) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or bool(little_endian) != (sys.byteorder == 'little'):
+            self._mm.close()
+            raise ValueError(f"{path} is not a catalog for this platform")
+
+        view = memoryview(self._mm)
+        pos = HEADER.size
+        self._offsets = view[pos:pos + 4 * (n_strings + 1)].cast('I')
+        pos += 4 * (n_strings + 1)
+        self._columns = {}
+        for name in COLUMNS:
+            self._columns[name] = view[pos:pos + 4 * self.rows].cast('I')
+            pos += 4 * self.rows
+        self._hosted = view[pos:pos + 4 * hosted_rows].cast('I')
+        pos += 4 * hosted_rows
+        self._group_starts = []
+        for count in n_groups:
+            self._group_starts.append(view[pos:pos + 4 * count].cast('I'))
+            pos += 4 * count
+        self._blob = view[pos:]
+        view.release()
+
+        self._groups = None     # built on first image lookup
+
+    @property
+    def hosted(self):
+        # a fresh view each time rather than an attribute: a reference cycle would
+        # keep a dropped catalog mapped until the cycle collector came around
+        return HostedVehicles(self)
+
+    def close(self):
+        """Release the mapping, so the file can be replaced (required on Windows)"""
+        for view in [self._offsets, self._hosted, self._blob, *self._columns.values(), *self._group_starts]:
+            view.release()
+        self._mm.close()
+
+    def string(self, string_id):
+        if string_id == MISSING:
+            return None
+        return str(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], 'utf-8')
+
+    def vehicle(self, row) -> dict:
+        return {name: self.string(self._columns[name][row]) for name in COLUMNS}
+
+    def _group_ranges(self) -> list:
+        """Per level, a dict of group key -> (start, end) range of hosted positions"""
+        if self._groups is None:
+            groups = []
+            for fields, starts in zip(GROUP_LEVELS, self._group_starts):
+                ranges = {}
+                for i, start in enumerate(starts):
+                    end = starts[i + 1] if i + 1 < len(starts) else len(self._hosted)
+                    row = self._hosted[start]
+                    ranges[tuple(self.string(self._columns[name][row]) or '' for name in fields)] = (start, end)
+                groups.append(ranges)
+            self._groups = groups
+        return self._groups
+
+    def sample_images(self, make, model, year, n, rng = random) -> list:
+        """
+        n hosted image urls for a vehicle. Images of the same make, model and
+        year come first, then sibling years of the model, then other models of
+        the make, then anything hosted. Urls repeat only if fewer than n exist.
+        """
+        total = len(self._hosted)
+        if total == 0 or n <= 0:
+            return []
+
+        vehicle = {"make": str(make or ''), "model": str(model or ''), "year": str(year or '')}
+        ranges = []
+        for fields, groups in reversed(list(zip(GROUP_LEVELS, self._group_ranges()))):
+            found = groups.get(tuple(vehicle[name] for name in fields))
+            if found:
+                ranges.append(found)
+        ranges.append((0, total))
+
+        # ranges are nested, narrowest first, so everything picked so far lies inside the next one
+        picked = []
+        seen = set()
+        for start, end in ranges:
+            need = n - len(picked)
+            if (end - start) - len(seen) <= need:
+                fresh = [i for i in range(start, end) if i not in seen]
+                rng.shuffle(fresh)
+            else:
+                fresh = []
+                while len(fresh) < need:
+                    i = rng.randrange(start, end)
+                    if i not in seen:
+                        seen.add(i)
+                        fresh.append(i)
+            seen.update(fresh)
+            picked.extend(fresh)
+            if len(picked) >= n:
+                break
+
+        while len(picked) < n:
+            picked.append(rng.randrange(total))
+        return [self.string(self._columns['hosted_url'][self._hosted[i]]) for i in picked[:n]]
+
+    def is_current(self, dataset_json) -> bool:
+        try:
+            stat = os.stat(dataset_json)
+        except FileNotFoundError:
+            return True     # nothing newer to rebuild from
+        return (stat.st_mtime_ns, stat.st_size) == (self.source_mtime_ns, self.source_size)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row) -> dict:
+        if not 0 <= row < self.rows:
+            raise IndexError(row)
+        return self.vehicle(row)
+
+
+class HostedVehicles:
+    """
+    The vehicles that have a live hosted_url, as a sequence, so random.choice()
+    picks one in O(1) without materialising the list.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.catalog._hosted)
+
+    def __getitem__(self, i) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.catalog.vehicle(self.catalog._hosted[i])
+
+
+def load_catalog(dataset_json = 'car_dataset.json') -> VehicleCatalog:
+    """
+    Open the catalog for a dataset, compiling it first if it is missing or the
+    JSON changed since it was built. Catalogs are cached per process.
+
+    A catalog that goes stale is only dropped from the cache, never closed:
+    callers may still hold it (or its hosted sequence) for the rest of a run,
+    and its mapping is released once the last of them lets go.
+    """
+    with _catalogs_lock:
+        catalog = _catalogs.pop(dataset_json, None)
+        if catalog and catalog.is_current(dataset_json):
+            _catalogs[dataset_json] = catalog
+            return catalog
+
+        path = catalog_path(dataset_json)
+        catalog = _open_current(path, dataset_json)
+        if catalog is None:
+            # the shards of a run may all find it stale at once; one compiles, the rest reopen
+            with file_lock(path + ".lock"):
+                catalog = _open_current(path, dataset_json)
+                if catalog is None:
+                    compile_catalog(dataset_json, path)
+                    catalog = VehicleCatalog(path)
+
+        _catalogs[dataset_json] = catalog
+        return catalog
+
+
+def _open_current(path, dataset_json):
+    """The catalog at path if it was built from the current JSON, else None"""
+    try:
+        catalog = VehicleCatalog(path)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None     # missing, empty, truncated or foreign file: rebuild it
+    if catalog.is_current(dataset_json):
+        return catalog
+    catalog.close()     # opened just now, nobody else has it
+    return None
+
+
+if __name__ == "__main__":
+    compile_catalog(sys.argv[1] if len(sys.argv) > 1 else 'car_dataset.json')